@@ -0,0 +1,82 @@
+import json
+import os
+import numpy
+from game import Brain
+from genetics import Population
+
+CHECKPOINT_FILE = 'checkpoint.npz'
+
+
+class Checkpoint:
+    def __init__(self, generation, population, fitness, rng_state, gen_data, sigma):
+        # the evaluated population of a generation, as it was before breeding the next one
+        self.generation = generation
+        self.population = population
+        self.fitness = fitness
+        self.rng_state = rng_state
+        self.gen_data = gen_data
+        self.sigma = sigma
+
+    def rng(self):
+        rng = numpy.random.default_rng()
+        rng.bit_generator.state = self.rng_state
+        return rng
+
+
+def save_checkpoint(run_dir, checkpoint):
+    meta = {
+        'generation': checkpoint.generation,
+        'genome_shapes': checkpoint.population.genome_shapes,
+        'rng_state': checkpoint.rng_state,
+        'gen_data': checkpoint.gen_data,
+        'sigma_generation': checkpoint.sigma[0],
+    }
+    sigma_genetics = checkpoint.sigma[1]
+
+    # write next to the old checkpoint and swap, so a crash mid-save keeps the previous one
+    path = os.path.join(run_dir, CHECKPOINT_FILE)
+    with open(path + '.tmp', 'wb') as f:
+        numpy.savez(
+            f,
+            genomes=checkpoint.population.genomes,
+            colors=checkpoint.population.colors,
+            fitness=numpy.asarray(checkpoint.fitness),
+            meta=numpy.array(json.dumps(meta)),
+            **{'sigma_' + w_layer: v_weights for w_layer, v_weights in sigma_genetics.items()},
+        )
+    os.replace(path + '.tmp', path)
+
+
+def load_checkpoint(run_dir):
+    with numpy.load(os.path.join(run_dir, CHECKPOINT_FILE)) as data:
+        meta = json.loads(data['meta'][()])
+        genome_shapes = {w_layer: tuple(shape) for w_layer, shape in meta['genome_shapes'].items()}
+        population = Population(data['genomes'], data['colors'], genome_shapes)
+        sigma_genetics = {w_layer: data['sigma_' + w_layer] for w_layer in genome_shapes}
+        return Checkpoint(
+            generation=meta['generation'],
+            population=population,
+            fitness=data['fitness'],
+            rng_state=meta['rng_state'],
+            gen_data={int(generation): stats for generation, stats in meta['gen_data'].items()},
+            sigma=(meta['sigma_generation'], sigma_genetics),
+        )
+
+
+def save_genetics(run_dir, genetics):
+    # one .npy file per weight matrix, loadable as a memory map
+    for w_layer, v_weights in genetics.items():
+        numpy.save(os.path.join(run_dir, '{}.npy'.format(w_layer)), v_weights)
+
+
+def load_blueprint(run_dir):
+    # memory-map the .npy weights, falling back to the text files of older runs
+    brain = Brain(0, 0, 0)
+    for w_layer in brain.serialize():
+        path = os.path.join(run_dir, w_layer)
+        if os.path.exists(path + '.npy'):
+            v_weights = numpy.load(path + '.npy', mmap_mode='r')
+        else:
+            v_weights = numpy.loadtxt(path + '.txt')
+        setattr(brain, w_layer, v_weights)
+    return brain
@@ -0,0 +1,13 @@
+import glob
+import os
+import sys
+import numpy
+
+# convert the w_*.txt weights of saved snakes to memory-mappable .npy files
+# usage: python convert_snake_data.py [snake_data directory]
+if __name__ == '__main__':
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else 'snake_data'
+    paths = sorted(glob.glob(os.path.join(data_dir, '**', 'w_*.txt'), recursive=True))
+    for path in paths:
+        numpy.save(path[:-len('.txt')] + '.npy', numpy.loadtxt(path))
+    print("Converted {} weight files in '{}'.".format(len(paths), data_dir))
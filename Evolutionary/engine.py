@@ -0,0 +1,355 @@
+import multiprocessing
+import os
+import pickle
+import random
+import numpy
+from checkpoint import Checkpoint, load_blueprint, load_checkpoint, save_checkpoint, save_genetics
+from evaluation import CachedEvaluator, FitnessCache, RacingEvaluator, SharedPoolEvaluator, VectorEvaluator
+from game import play_game
+from genetics import Population, next_generation, rank
+from inference import PRECISIONS
+from profiling import PROFILE_DIR, Profiler, breakdown, merge
+from replay import SEED_LIMIT, append_replay, truncate_replays
+from telemetry import Telemetry
+
+
+# default world constants; main.py's flags override them for a run
+SHOW_GRAPHICS = False
+POPULATION_SIZE = 2000
+MUTATION_RATE = 0.01
+BREEDING_THRESHOLD = 0.25
+MAX_GENERATIONS = 50
+BLUEPRINT_SNAKE_ID = None
+PROCESSES = None  # evaluation workers of the 'shared', 'sharded' and 'pool' backends; None uses every core
+# 'shared': one pool + shared-memory genomes, 'pool': new pool pickling snakes per generation,
+# 'vector': all games in lockstep in this process, 'sharded': lockstep shards on the shared pool,
+# 'racing': 'vector' with successive halving, stopping games that fall well behind the breeding cut
+EVALUATION_BACKEND = 'sharded'
+EVALUATION_BACKENDS = ('shared', 'pool', 'vector', 'sharded', 'racing')
+EPISODES = 1  # games per genome on the 'sharded' and 'vector' backends, which the others reject; fitness is their mean
+RACING_AUDIT_INTERVAL = 10  # generations between checks of the raced breeding set against a full evaluation; 0 disables them
+CHECKPOINT_INTERVAL = 5  # generations between checkpoints of the whole population; 0 disables them
+RESUME_SNAKE_ID = None  # id of an interrupted run to continue from its last checkpoint
+SEED = None  # seed of the initial population and of breeding; None draws one
+# fixed fruit seed for every game of the 'shared', 'sharded', 'vector' and 'racing' backends, which the others reject; None keeps games random
+EVALUATION_SEED = None
+FITNESS_CACHE_SIZE = 100000  # genomes whose results are reused while EVALUATION_SEED is set; 0 disables the cache
+# weights of the 'sharded', 'vector' and 'racing' backends, which the others only play at 'float64': 'float64', or 'float32' / 'int8'
+# (played as float32), which halve / quarter the genomes shared with the workers; python precision.py measures the decisions they change
+INFERENCE_PRECISION = 'float64'
+# sample the stacks of this process and of the 'shared' / 'sharded' workers into snake_data/<id>/profile/,
+# merged at the end into combined.pstats and combined.collapsed (flame graph input)
+PROFILE = False
+PROFILE_INTERVAL = 0.005  # seconds between stack samples
+PROFILE_BREAKDOWN = ('decide', 'nn_process', 'sense', 'on_body', 'forward', 'step', 'connection.py')  # reported shares of worker samples
+RECORD_REPLAYS = True  # log every generation's alpha game on the 'sharded', 'vector' and 'racing' backends; python replay.py <id> plays it back
+DATA_DIR = 'snake_data'  # run directories are <DATA_DIR>/<id>/
+
+
+class Config:
+    def __init__(self, population_size: int = POPULATION_SIZE, mutation_rate: float = MUTATION_RATE, breeding_threshold: float = BREEDING_THRESHOLD,
+                 max_generations: int = MAX_GENERATIONS, blueprint_snake_id=BLUEPRINT_SNAKE_ID, processes=PROCESSES, show_graphics=SHOW_GRAPHICS,
+                 evaluation_backend: str = EVALUATION_BACKEND, episodes: int = EPISODES, racing_audit_interval: int = RACING_AUDIT_INTERVAL,
+                 checkpoint_interval: int = CHECKPOINT_INTERVAL, resume_snake_id=RESUME_SNAKE_ID, evaluation_seed=EVALUATION_SEED,
+                 fitness_cache_size: int = FITNESS_CACHE_SIZE, inference_precision: str = INFERENCE_PRECISION, profile=PROFILE,
+                 profile_interval: float = PROFILE_INTERVAL, record_replays=RECORD_REPLAYS, data_dir: str = DATA_DIR, seed=SEED):
+        # everything a world runs with, each defaulting to the constant of the same name
+        if evaluation_backend not in EVALUATION_BACKENDS:
+            raise ValueError("unknown evaluation backend {!r}, expected one of {}".format(evaluation_backend, EVALUATION_BACKENDS))
+        # settings the games would otherwise ignore; watched games are played one at a time, like the 'pool' backend's
+        backend = 'graphics' if show_graphics else evaluation_backend
+        if episodes != 1 and backend not in ('sharded', 'vector'):
+            raise ValueError("{} episodes per genome need the 'sharded' or 'vector' backend, not {!r}".format(episodes, backend))
+        if inference_precision not in PRECISIONS:
+            raise ValueError("unknown inference precision {!r}, expected one of {}".format(inference_precision, tuple(PRECISIONS)))
+        if inference_precision != 'float64' and backend not in ('sharded', 'vector', 'racing'):
+            raise ValueError("{} inference needs the 'sharded', 'vector' or 'racing' backend, not {!r}".format(inference_precision, backend))
+        if evaluation_seed is not None and backend in ('pool', 'graphics'):
+            raise ValueError("a fixed evaluation seed needs the 'shared', 'sharded', 'vector' or 'racing' backend, not {!r}".format(backend))
+        if evaluation_seed is not None and record_replays and not 0 <= evaluation_seed < SEED_LIMIT:
+            raise ValueError("recorded replays store fruit seeds of 0 to 2**64 - 1, not {}".format(evaluation_seed))
+        self.population_size = population_size
+        self.mutation_rate = mutation_rate
+        self.breeding_threshold = breeding_threshold
+        self.max_generations = max_generations
+        self.blueprint_snake_id = blueprint_snake_id
+        self.processes = processes
+        self.show_graphics = show_graphics
+        self.evaluation_backend = evaluation_backend
+        self.episodes = episodes
+        self.racing_audit_interval = racing_audit_interval
+        self.checkpoint_interval = checkpoint_interval
+        self.resume_snake_id = resume_snake_id
+        self.evaluation_seed = evaluation_seed
+        self.fitness_cache_size = fitness_cache_size
+        self.inference_precision = inference_precision
+        self.profile = profile
+        self.profile_interval = profile_interval
+        self.record_replays = record_replays
+        self.data_dir = data_dir
+        self.seed = seed
+
+
+class Engine:
+    def __init__(self, config, log=print, evaluator=None):
+        # one world of the generational GA; nothing is created until start(), so building an Engine is cheap,
+        # and log receives every progress line. an evaluator given here replaces the backend's and is closed with the world
+        self.config = config
+        self.log = log
+        self.id = config.resume_snake_id or random.randint(10000, 99999)
+        self.run_dir = "{}/{}/".format(config.data_dir, self.id)
+        self.profile_dir = os.path.join(self.run_dir, PROFILE_DIR)
+        self.rng = numpy.random.default_rng(config.seed)
+        self.generation = 0
+        self.gen_data = {
+            0: {
+                'gen_fitness': None,
+                'gen_fitness_roc': None,
+                'alpha_fitness': None,
+                'alpha_size': None,
+            }
+        }
+        # generation and genetics of the fittest alpha so far
+        self.sigma = (None, None)
+        self.population = None
+        self.evaluator = evaluator
+        self.renderer = None
+        self.profiler = None
+        self.telemetry = None
+        # seconds spent in each phase over the whole run
+        self.timings = {}
+
+    def start(self):
+        config = self.config
+        os.makedirs(self.run_dir, exist_ok=True)
+        self.profiler = Profiler(config.profile_interval, label='parent') if config.profile else None
+        self.telemetry = Telemetry(self.run_dir, profiler=self.profiler)
+
+        # create initial snake generation
+        if config.resume_snake_id:
+            # re-breed the checkpointed generation with its saved rng state
+            checkpoint = load_checkpoint(self.run_dir)
+            self.generation, self.gen_data, self.sigma, self.rng = checkpoint.generation, checkpoint.gen_data, checkpoint.sigma, checkpoint.rng()
+            # the generations after the checkpoint are played again, so their earlier records go
+            self.telemetry.truncate(self.generation)
+            truncate_replays(self.run_dir, self.generation)
+            self.population = next_generation(checkpoint.population, checkpoint.fitness, breeding_threshold=config.breeding_threshold,
+                                              mutation_rate=config.mutation_rate, rng=self.rng)
+        elif config.blueprint_snake_id:
+            blueprint_brain = load_blueprint('{}/{}/'.format(config.data_dir, config.blueprint_snake_id))
+            self.population = Population.from_blueprint(blueprint_brain, size=config.population_size, mutation_rate=config.mutation_rate, rng=self.rng)
+        else:
+            # use completely randomized snakes
+            self.population = Population.random(size=config.population_size, rng=self.rng)
+
+        # the renderer (and pygame) is only loaded when watching the games; the 'pool' backend makes its pool per generation
+        if config.show_graphics:
+            from render import Renderer
+            self.renderer = Renderer()
+        elif self.evaluator is None and config.evaluation_backend != 'pool':
+            self.evaluator = self.make_evaluator()
+
+        # begin world game
+        self.log("\n-- World begin --")
+        self.log("ID: {}\n".format(self.id))
+        if self.profiler:
+            self.profiler.start()
+
+    def make_evaluator(self):
+        config = self.config
+        genome_shapes = self.population.genome_shapes
+        if config.evaluation_backend in ('shared', 'sharded'):
+            evaluator = SharedPoolEvaluator(population_size=config.population_size, processes=config.processes, vectorized=config.evaluation_backend == 'sharded',
+                                            genome_shapes=genome_shapes, episodes=config.episodes, precision=config.inference_precision, record=config.record_replays,
+                                            profile_dir=self.profile_dir if config.profile else None, profile_interval=config.profile_interval)
+        elif config.evaluation_backend == 'vector':
+            evaluator = VectorEvaluator(genome_shapes=genome_shapes, episodes=config.episodes, precision=config.inference_precision, record=config.record_replays)
+        else:
+            evaluator = RacingEvaluator(breeding_threshold=config.breeding_threshold, genome_shapes=genome_shapes, precision=config.inference_precision, record=config.record_replays)
+        # cached results are only valid when every evaluation replays the same fruit, and raced results depend on the whole generation
+        if config.evaluation_backend != 'racing' and config.evaluation_seed is not None and config.fitness_cache_size:
+            evaluator = CachedEvaluator(evaluator, FitnessCache(config.fitness_cache_size))
+        return evaluator
+
+    def run(self):
+        # the whole world: every generation up to max_generations, then its summary; the evaluator's workers and
+        # shared memory are released even when a generation fails or the run is interrupted
+        try:
+            self.start()
+            while self.generation < self.config.max_generations:
+                self.step()
+        finally:
+            self.close()
+        return self.finish()
+
+    def begin(self):
+        # new generation
+        self.generation += 1
+        self.log("Generation: {}".format(self.generation))
+
+    def step(self):
+        self.begin()
+
+        # test the fitness of each snake in the generation; results are (fitness, size, time lived)
+        snakes_in = snakes = None
+        with self.telemetry.phase('evaluation'):
+            if self.renderer:
+                # run sync with graphics
+                snakes = [play_game(snake, renderer=self.renderer) for snake in self.population.snakes()]
+                results = [(snake.fitness(), snake.size(), snake.time_lived) for snake in snakes]
+                eval_stats = {'processes': 1, 'busy_seconds': None, 'ipc_bytes': 0, 'worker_peak_rss_mb': None, 'steps': sum(snake.time_lived for snake in snakes)}
+            elif self.evaluator is None:
+                # run async without graphics
+                snakes_in = self.population.snakes()
+                with multiprocessing.Pool(self.config.processes) as pool:
+                    snakes = pool.map(play_game, snakes_in)
+                results = [(snake.fitness(), snake.size(), snake.time_lived) for snake in snakes]
+                eval_stats = {'processes': self.config.processes or os.cpu_count(), 'busy_seconds': None, 'ipc_bytes': None, 'worker_peak_rss_mb': None,
+                              'steps': sum(snake.time_lived for snake in snakes)}
+            else:
+                # run on the evaluation backend without graphics
+                results = self.evaluator.evaluate(self.population.genomes, seed=self.config.evaluation_seed)
+                eval_stats = self.evaluator.stats
+        if snakes_in is not None:
+            # re-pickled outside the timed phase: the pool sends every snake out and back
+            eval_stats['ipc_bytes'] = len(pickle.dumps(snakes_in)) + len(pickle.dumps(snakes))
+        self.advance(results, eval_stats)
+
+    def advance(self, results, eval_stats):
+        # select, breed and log the generation begun last, whose evaluation time the telemetry already holds
+        config = self.config
+        generation, gen_data, population, telemetry = self.generation, self.gen_data, self.population, self.telemetry
+        self.log("Fitness testing completed in {} seconds".format(round(telemetry.phases['evaluation'], 2)))
+        if 'cache_hit_rate' in eval_stats:
+            self.log("Fitness cache: hit rate={}, cached genomes={}, size={}".format(eval_stats['cache_hit_rate'], eval_stats['cached_genomes'], len(self.evaluator.cache)))
+        if 'fitness_variance' in eval_stats:
+            self.log("Episodes: {} per snake, mean fitness variance={}".format(config.episodes, round(eval_stats['fitness_variance'], 2)))
+        if 'raced_out' in eval_stats:
+            self.log("Racing: {} games stopped early".format(eval_stats['raced_out']))
+
+        # replay the generation with and without racing on the same fruit
+        racing_overlap = None
+        if isinstance(self.evaluator, RacingEvaluator) and config.racing_audit_interval and generation % config.racing_audit_interval == 0:
+            with telemetry.phase('racing_audit'):
+                racing_overlap, racing_time = self.evaluator.audit(population.genomes, seed=random.getrandbits(32))
+            self.log("Racing audit: breeding set overlap={}, time vs full={}".format(round(racing_overlap, 3), round(racing_time, 3)))
+
+        # sort snakes by fitness
+        with telemetry.phase('selection'):
+            fitness = [result[0] for result in results]
+            alpha = rank(fitness)[0]
+            alpha_fitness, alpha_size, _ = results[alpha]
+            alpha_color = tuple(population.colors[alpha].tolist())
+            if self.sigma[0] is None or alpha_fitness > gen_data[self.sigma[0]]['alpha_fitness']:
+                self.sigma = (generation, population.brain(alpha).serialize())
+
+            # analyze generation results
+            gen_fitness = round(sum(fitness) / len(population), 2)
+            gen_fitness_roc = 0
+            if gen_data[generation - 1]['gen_fitness']:
+                gen_fitness_roc = round(gen_fitness - gen_data[generation - 1]['gen_fitness'], 2)
+
+        # breed the next gen of snakes from the fittest breeding_threshold
+        with telemetry.phase('breeding'):
+            rng_state = self.rng.bit_generator.state
+            offspring = next_generation(population, fitness, breeding_threshold=config.breeding_threshold, mutation_rate=config.mutation_rate, rng=self.rng)
+        self.log("Generation finished breeding in {} seconds".format(round(telemetry.phases['breeding'], 3)))
+
+        # store & log generation results
+        gen_data[generation] = {
+            'gen_fitness': gen_fitness,
+            'gen_fitness_roc': gen_fitness_roc,
+            'alpha_fitness': alpha_fitness,
+            'alpha_size': alpha_size,
+        }
+        self.log("Gen: fitness={}, fitness ROC={}".format(gen_fitness, gen_fitness_roc))
+        self.log("Alpha: fitness={}, size={}, color={}".format(alpha_fitness, alpha_size, alpha_color))
+
+        # checkpoint the evaluated generation, and keep the alpha's game when it was recorded
+        with telemetry.phase('persistence'):
+            replay = self.evaluator.replays.get(alpha) if self.evaluator else None
+            if replay is not None:
+                replay.generation, replay.color = generation, alpha_color
+                append_replay(self.run_dir, replay)
+            if config.checkpoint_interval and generation % config.checkpoint_interval == 0:
+                save_checkpoint(self.run_dir, Checkpoint(generation, population, fitness, rng_state, gen_data, self.sigma))
+                self.log("Checkpoint saved to '{}'.".format(self.run_dir))
+
+        # one metrics record per generation; utilisation is the workers' busy share of the evaluation wall time, and
+        # steps are the evaluator's count of simulated frames over every episode, as the results only hold each genome's mean
+        steps = eval_stats['steps']
+        evaluation_time = telemetry.phases['evaluation']
+        for phase, seconds in telemetry.phases.items():
+            self.timings[phase] = self.timings.get(phase, 0.0) + seconds
+        telemetry.record(
+            generation,
+            backend='graphics' if self.renderer else config.evaluation_backend,
+            population_size=len(population),
+            steps=steps,
+            steps_per_sec=round(steps / evaluation_time, 1),
+            processes=eval_stats['processes'],
+            worker_utilisation=round(eval_stats['busy_seconds'] / (evaluation_time * eval_stats['processes']), 3) if eval_stats['busy_seconds'] is not None else None,
+            ipc_bytes=eval_stats['ipc_bytes'],
+            genome_bytes=eval_stats.get('genome_bytes'),
+            precision=config.inference_precision,
+            worker_peak_rss_mb=eval_stats['worker_peak_rss_mb'],
+            cache_hit_rate=eval_stats.get('cache_hit_rate'),
+            cached_genomes=eval_stats.get('cached_genomes'),
+            raced_out=eval_stats.get('raced_out'),
+            fitness_variance=eval_stats.get('fitness_variance'),
+            racing_overlap=racing_overlap,
+            **gen_data[generation],
+        )
+        self.population = offspring
+        self.log("")
+
+    def close(self):
+        if self.evaluator:
+            self.evaluator.close()
+            self.evaluator = None
+
+    def finish(self):
+        # close the workers, report and save the world, and return its summary
+        config = self.config
+        self.close()
+
+        # the workers saved their profiles when the pool closed
+        if self.profiler:
+            self.profiler.stop()
+            self.profiler.save(self.profile_dir)
+            _, collapsed = merge(self.profile_dir)
+            for root, names in (('parent', ('<evaluation>', '<selection>', '<breeding>', '<persistence>')), ('worker', PROFILE_BREAKDOWN)):
+                shares, samples = breakdown(collapsed, names, root)
+                if samples:
+                    self.log("Profile {}: {} samples, {}".format(root, samples, ", ".join("{}={}".format(name, round(share, 3)) for name, share in shares.items())))
+            self.log("Profile saved to '{}'.".format(self.profile_dir))
+
+        # analyze world multi-generational results
+        generations = range(1, config.max_generations + 1)
+        world_fitness = round(sum([self.gen_data[i]['gen_fitness'] for i in generations]) / config.max_generations, 2)
+        world_fitness_roc = round(sum([self.gen_data[i]['gen_fitness_roc'] for i in generations]) / config.max_generations, 2)
+        self.gen_data.pop(0, None)
+        sigma_generation = self.sigma[0]
+
+        # report results
+        self.log("-- World complete --")
+        self.log("Parameters: id={}, max generations={}, population size={}, mutation rate={}, breeding threshold={}, blueprint snake={}".format(
+            self.id, config.max_generations, config.population_size, config.mutation_rate, config.breeding_threshold, config.blueprint_snake_id
+        ))
+        self.log("World: fitness={}, fitness ROC={}".format(world_fitness, world_fitness_roc))
+        self.log("Sigma: generation={}, fitness={}, size={}".format(
+            sigma_generation, self.gen_data[sigma_generation]['alpha_fitness'], self.gen_data[sigma_generation]['alpha_size']
+        ))
+
+        # save results
+        save_genetics(self.run_dir, self.sigma[1])
+        self.log("Sigma genetics saved to '{}'.".format(self.run_dir))
+        return {
+            'id': self.id,
+            'world_fitness': world_fitness,
+            'world_fitness_roc': world_fitness_roc,
+            'sigma_generation': sigma_generation,
+            'sigma_fitness': self.gen_data[sigma_generation]['alpha_fitness'],
+            'sigma_size': self.gen_data[sigma_generation]['alpha_size'],
+            'timings': {phase: round(seconds, 3) for phase, seconds in self.timings.items()},
+        }
@@ -0,0 +1,322 @@
+import hashlib
+import math
+import multiprocessing
+import os
+import pickle
+import random
+import time
+from collections import OrderedDict
+from multiprocessing import shared_memory
+import numpy
+from game import Brain, Snake, GENOME_SHAPES, genome_size, play_game
+from genetics import rank
+from inference import PRECISIONS, PopulationBrain, compress, n_rows
+from profiling import init_worker
+from telemetry import peak_rss_mb
+from vector_env import VectorGame
+
+# worker-side view of the population's genomes, and of their row scales when stored as int8
+_shm = None
+_genomes = None
+_scales = None
+_genome_shapes = None
+
+
+def _views(shm, shape, genome_shapes, precision: str):
+    # genomes at the start of the shared block, followed by the int8 row scales
+    genomes = numpy.ndarray(shape, dtype=PRECISIONS[precision], buffer=shm.buf)
+    if precision != 'int8':
+        return genomes, None
+    return genomes, numpy.ndarray((shape[0], n_rows(genome_shapes)), dtype=numpy.float32, buffer=shm.buf, offset=genomes.nbytes)
+
+
+def _attach(shm_name: str, shape, genome_shapes, precision: str):
+    global _shm, _genomes, _scales, _genome_shapes
+    _shm = shared_memory.SharedMemory(name=shm_name)
+    _genomes, _scales = _views(_shm, shape, genome_shapes, precision)
+    _genome_shapes = genome_shapes
+
+    # forked workers would otherwise all replay the parent's fruit sequence
+    random.seed()
+    numpy.random.seed()
+
+
+def _evaluate(task):
+    # the game's result, with the worker's busy seconds and peak RSS
+    index, seed = task
+    start = time.perf_counter()
+    if seed is not None:
+        random.seed(seed)
+    snake = play_game(Snake(brain=Brain.from_genome(_genomes[index], _genome_shapes)))
+    return (snake.fitness(), snake.size(), snake.time_lived), time.perf_counter() - start, peak_rss_mb()
+
+
+def _evaluate_shard(rows):
+    # play a contiguous block of genomes in lockstep, episodes games each; with record, the shard's fittest
+    # genome comes back with the replay of its game, the population's alpha being one of them. the steps
+    # of every episode come back too, as the results only hold each genome's mean
+    start, stop, seed, episodes, record = rows
+    start_time = time.perf_counter()
+    game = VectorGame(stop - start, seed=seed, episodes=episodes, record=record)
+    game.run(PopulationBrain.from_genomes(_genomes[start:stop], _genome_shapes, None if _scales is None else _scales[start:stop]))
+    alpha = None
+    if record and stop > start:
+        index, replay = game.alpha_replay()
+        alpha = (start + index, replay)
+    return game.results(), time.perf_counter() - start_time, peak_rss_mb(), game.fitness_variance(), alpha, game.steps()
+
+
+class VectorEvaluator:
+    def __init__(self, genome_shapes=GENOME_SHAPES, episodes: int = 1, precision: str = 'float64', record=False):
+        # with several episodes the results hold each genome's mean and variance keeps its fitness variance;
+        # with record, replays holds the replay of the fittest genome's game by its index
+        self.genome_shapes = genome_shapes
+        self.episodes = episodes
+        self.precision = precision
+        self.record = record
+        self.variance = None
+        self.replays = {}
+        self.stats = {}
+
+    def evaluate(self, genomes, seed=None):
+        # every game of the generation in one lockstep VectorGame, in this process
+        start = time.perf_counter()
+        game = VectorGame(len(genomes), seed=seed, episodes=self.episodes, record=self.record)
+        stored, scales = compress(genomes, self.genome_shapes, self.precision)
+        game.run(PopulationBrain.from_genomes(stored, self.genome_shapes, scales))
+        self.variance = game.fitness_variance()
+        self.replays = dict([game.alpha_replay()]) if self.record else {}
+        self.stats = {'processes': 1, 'busy_seconds': time.perf_counter() - start, 'ipc_bytes': 0, 'worker_peak_rss_mb': peak_rss_mb(), 'steps': game.steps()}
+        if self.episodes > 1:
+            self.stats['fitness_variance'] = float(self.variance.mean())
+        return game.results()
+
+    def close(self):
+        pass
+
+
+class RacingEvaluator:
+    def __init__(self, breeding_threshold: float, first_budget: int = 50, keep: float = 2.0, genome_shapes=GENOME_SHAPES, precision: str = 'float64', record=False):
+        # successive halving in one lockstep VectorGame: games play rounds of doubling step budgets, and after
+        # each round only live games still ranked within keep times the breeding cut play on
+        self.breeding_threshold = breeding_threshold
+        self.first_budget = first_budget
+        self.keep = keep
+        self.genome_shapes = genome_shapes
+        self.precision = precision
+        self.record = record
+        self.replays = {}
+        self.stats = {}
+
+    def brain(self, genomes):
+        stored, scales = compress(genomes, self.genome_shapes, self.precision)
+        return PopulationBrain.from_genomes(stored, self.genome_shapes, scales)
+
+    def race(self, genomes, seed=None, record=False):
+        game = VectorGame(len(genomes), seed=seed, record=record)
+        brain = self.brain(genomes)
+        n_keep = math.ceil(math.floor(len(genomes) * self.breeding_threshold) * self.keep)
+        budget, raced_out = self.first_budget, 0
+        while True:
+            game.run(brain, max_steps=budget)
+            if not game.alive.any():
+                break
+            # stopped games keep their partial fitness, which ranks them below the breeding cut
+            behind = rank(game.fitness())[n_keep:]
+            behind = behind[game.alive[behind]]
+            game.alive[behind] = False
+            raced_out += len(behind)
+            budget *= 2
+        return game, raced_out
+
+    def evaluate(self, genomes, seed=None):
+        start = time.perf_counter()
+        game, raced_out = self.race(genomes, seed, record=self.record)
+        self.replays = dict([game.alpha_replay()]) if self.record else {}
+        self.stats = {'processes': 1, 'busy_seconds': time.perf_counter() - start, 'ipc_bytes': 0, 'worker_peak_rss_mb': peak_rss_mb(), 'steps': game.steps(),
+                      'raced_out': raced_out}
+        return game.results()
+
+    def audit(self, genomes, seed):
+        # share of the full evaluation's breeding set that racing also selects, playing the same fruit, and the time ratio
+        n_selected = math.floor(len(genomes) * self.breeding_threshold)
+        start = time.perf_counter()
+        raced, _ = self.race(genomes, seed)
+        race_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        full = VectorGame(len(genomes), seed=seed)
+        full.run(self.brain(genomes))
+        full_time = time.perf_counter() - start
+
+        selected = set(rank(raced.fitness())[:n_selected].tolist())
+        overlap = len(selected.intersection(rank(full.fitness())[:n_selected].tolist())) / max(n_selected, 1)
+        return overlap, race_time / full_time
+
+    def close(self):
+        pass
+
+
+class SharedPoolEvaluator:
+    def __init__(self, population_size: int, genome_shapes, processes=None, vectorized=False, episodes: int = 1, precision: str = 'float64', record=False,
+                 profile_dir=None, profile_interval: float = 0.005):
+        # one genome row per snake, laid out as genome_shapes (the population's, which a blueprint may have changed),
+        # shared with every worker for the whole run; below float64 the rows
+        # are stored at precision, int8 ones followed by their row scales; only the vectorized shards record replays.
+        # with a profile_dir, every worker samples its stack each profile_interval seconds and saves it there on close
+        if episodes > 1 and not vectorized:
+            raise ValueError("several episodes per genome need the vectorized shards")
+        if precision != 'float64' and not vectorized:
+            raise ValueError("reduced-precision inference needs the vectorized shards")
+        self.vectorized = vectorized
+        # the worker function of a task
+        self.play = _evaluate_shard if vectorized else _evaluate
+        self.episodes = episodes
+        self.precision = precision
+        self.record = record and vectorized
+        self.genome_shapes = genome_shapes
+        self.variance = None
+        self.replays = {}
+        self.processes = processes or os.cpu_count()
+        self.shape = (population_size, genome_size(genome_shapes))
+        size = self.shape[0] * self.shape[1] * numpy.dtype(PRECISIONS[precision]).itemsize
+        if precision == 'int8':
+            size += self.shape[0] * n_rows(genome_shapes) * 4
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.genomes, self.scales = _views(self.shm, self.shape, genome_shapes, precision)
+        initializer, initargs = _attach, (self.shm.name, self.shape, genome_shapes, precision)
+        if profile_dir is not None:
+            initializer, initargs = init_worker, (profile_dir, profile_interval, initializer) + initargs
+        self.pool = multiprocessing.Pool(self.processes, initializer=initializer, initargs=initargs)
+        self.stats = {}
+
+    def evaluate(self, genomes, seed=None):
+        # workers only receive genome indices and send back (fitness, length, time_lived)
+        genome_bytes = self.write(genomes)
+        tasks = self.tasks(len(genomes), seed)
+        replies = self.pool.map(self.play, tasks)
+        results, self.stats, self.variance, self.replays = self.collect(tasks, replies, genome_bytes)
+        return results
+
+    def write(self, genomes, offset: int = 0):
+        # store genomes in the shared rows from offset on, returning their bytes at the evaluator's precision
+        if genomes.shape[1] != self.shape[1] or offset + len(genomes) > self.shape[0]:
+            raise ValueError("{} genomes of {} weights don't fit the shared rows {} to {} of {} weights".format(
+                len(genomes), genomes.shape[1], offset, self.shape[0], self.shape[1]))
+        stored, scales = compress(genomes, self.genome_shapes, self.precision)
+        self.genomes[offset:offset + len(genomes)] = stored
+        if scales is not None:
+            self.scales[offset:offset + len(scales)] = scales
+        return stored.nbytes + (0 if scales is None else scales.nbytes)
+
+    def tasks(self, n_genomes: int, seed=None, offset: int = 0):
+        # one task per genome, or one lockstep shard per worker, over the n_genomes shared rows from offset on
+        if not self.vectorized:
+            return [(index, seed) for index in range(offset, offset + n_genomes)]
+        bounds = numpy.linspace(offset, offset + n_genomes, self.processes + 1).astype(int)
+        return [(start, stop, seed, self.episodes, self.record) for start, stop in zip(bounds[:-1].tolist(), bounds[1:].tolist())]
+
+    def collect(self, tasks, replies, genome_bytes: int, offset: int = 0):
+        # results, stats, fitness variance and replays of a batch from the replies to its tasks, in task order;
+        # replays are keyed by the genome's index within the batch
+        variance, replays = None, {}
+        if not self.vectorized:
+            results = [reply[0] for reply in replies]
+            steps = sum(result[2] for result in results)
+        else:
+            results = [result for reply in replies for result in reply[0]]
+            variance = numpy.concatenate([reply[3] for reply in replies])
+            replays = {index - offset: replay for index, replay in (reply[4] for reply in replies if reply[4] is not None)}
+            steps = sum(reply[5] for reply in replies)
+
+        # ipc_bytes is the pickled size of the tasks and replies, without the pool's framing
+        stats = {
+            'processes': self.processes,
+            'busy_seconds': sum(reply[1] for reply in replies),
+            'ipc_bytes': len(pickle.dumps(tasks)) + len(pickle.dumps(replies)),
+            'genome_bytes': genome_bytes,
+            'worker_peak_rss_mb': max((reply[2] for reply in replies if reply[2] is not None), default=None),
+            'steps': steps,
+        }
+        if self.episodes > 1:
+            stats['fitness_variance'] = float(variance.mean())
+        return results, stats, variance, replays
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        del self.genomes, self.scales
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FitnessCache:
+    def __init__(self, max_size: int):
+        # results of evaluated genomes by genome hash and seed, evicting the least recently used
+        self.max_size = max_size
+        self.entries = OrderedDict()
+
+    @staticmethod
+    def key(genome, seed):
+        digest = hashlib.sha256(str(seed).encode())
+        digest.update(numpy.ascontiguousarray(genome))
+        return digest.digest()
+
+    def get(self, key):
+        result = self.entries.get(key)
+        if result is not None:
+            self.entries.move_to_end(key)
+        return result
+
+    def put(self, key, result):
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class CachedEvaluator:
+    def __init__(self, evaluator, cache):
+        # only dispatches genomes the cache has not seen under this seed; duplicates within a batch are played once
+        self.evaluator = evaluator
+        self.cache = cache
+        self.replays = {}
+        self.stats = {}
+
+    def evaluate(self, genomes, seed):
+        keys = [FitnessCache.key(genome, seed) for genome in genomes]
+        results = [self.cache.get(key) for key in keys]
+
+        # first row of every uncached genome
+        misses = {}
+        for row, (key, result) in enumerate(zip(keys, results)):
+            if result is None and key not in misses:
+                misses[key] = row
+
+        # replays only exist for genomes played this time, by their row in the batch
+        fresh, self.replays = {}, {}
+        if misses:
+            rows = list(misses.values())
+            fresh = dict(zip(misses, self.evaluator.evaluate(genomes[rows], seed=seed)))
+            for key, result in fresh.items():
+                self.cache.put(key, result)
+            self.replays = {rows[index]: replay for index, replay in self.evaluator.replays.items()}
+            self.stats = dict(self.evaluator.stats)
+        else:
+            self.stats = {'processes': 0, 'busy_seconds': None, 'ipc_bytes': 0, 'worker_peak_rss_mb': None, 'steps': 0}
+        # the steps are those of the games played this time; the other genomes reused a result
+        self.stats['cached_genomes'] = len(genomes) - len(misses)
+        self.stats['cache_hit_rate'] = round(1 - len(misses) / len(genomes), 4)
+        return [result if result is not None else fresh[key] for key, result in zip(keys, results)]
+
+    def close(self):
+        self.evaluator.close()
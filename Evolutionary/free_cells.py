@@ -0,0 +1,31 @@
+import random
+
+
+class FreeCells:
+    def __init__(self, n_cells: int):
+        # the cells without a body segment: cells[:count] holds them in any order and position[cell] is the index
+        # of cell in cells, so a cell is taken or freed by swapping it across the boundary at count
+        self.cells = list(range(n_cells))
+        self.position = list(range(n_cells))
+        self.count = n_cells
+
+    def __len__(self):
+        return self.count
+
+    def swap(self, cell, index):
+        other = self.cells[index]
+        position = self.position[cell]
+        self.cells[position], self.cells[index] = other, cell
+        self.position[other], self.position[cell] = position, index
+
+    def remove(self, cell):
+        self.count -= 1
+        self.swap(cell, self.count)
+
+    def add(self, cell):
+        self.swap(cell, self.count)
+        self.count += 1
+
+    def sample(self):
+        # a uniformly random free cell; a snake filling the board has won before there is none
+        return self.cells[random.randrange(self.count)]
@@ -0,0 +1,288 @@
+import os
+import random
+import numpy.random
+from free_cells import FreeCells
+from inference import sigmoid
+from sensors import RayCaster
+
+# game constants
+MIN_SNAKE_SIZE = 4
+# the board defaults to 20x20 cells; SNAKE_GRID_SIZE=<cols>x<rows> plays on another size, which genomes don't depend on
+GRID_SIZE = GRID_COLS, GRID_ROWS = tuple(int(n) for n in os.environ.get('SNAKE_GRID_SIZE', '20x20').split('x'))
+N_CELLS = GRID_COLS * GRID_ROWS
+# boards need a cell for the snake and one for a fruit; above 65536 cells, fruit cells and counts no longer fit the 16 bits
+# replays store them in, and every lockstep game holds a body slot and an occupancy byte per cell
+MAX_CELLS = 1 << 16
+if min(GRID_SIZE) < 1 or not 2 <= N_CELLS <= MAX_CELLS:
+    raise ValueError("SNAKE_GRID_SIZE={}x{} is not a board of 2 to {} cells".format(GRID_COLS, GRID_ROWS, MAX_CELLS))
+OFF_BOARD = N_CELLS
+BODY_CAPACITY = N_CELLS + 2
+START_COORDS = (GRID_COLS // 2, GRID_ROWS // 2)
+VELOCITIES = {
+    'west': (-1, 0),
+    'east': (1, 0),
+    'north': (0, -1),
+    'south': (0, 1),
+    'north-west': (-1, -1),
+    'north-east': (1, -1),
+    'south-west': (-1, 1),
+    'south-east': (1, 1),
+}
+DECISIONS = ['west', 'east', 'north', 'south']
+
+# brain constants; a genome is the three weight matrices flattened back to back
+N_INPUT, N_HIDDEN, N_OUTPUT = 24, 48, 4
+GENOME_SHAPES = {
+    'w_input_hidden': (N_HIDDEN, N_INPUT + 1),
+    'w_hidden_hidden': (N_HIDDEN, N_HIDDEN + 1),
+    'w_hidden_output': (N_OUTPUT, N_HIDDEN + 1),
+}
+SENSORS = RayCaster(GRID_COLS, GRID_ROWS, VELOCITIES.values())
+
+
+class Fruit:
+    def __init__(self, snake, cell=None):
+        # uniform over the cells off the body, drawn from the snake's free-cell index, unless the cell is given
+        self.cell = snake.free.sample() if cell is None else int(cell)
+        self.y, self.x = divmod(self.cell, GRID_COLS)
+        self.color = (255, 0, 0)
+
+
+class Brain:
+    def __init__(self, n_input: int, n_hidden: int, n_output: int):
+        self.w_input_hidden = numpy.random.uniform(low=-1.0, high=1.0, size=(n_hidden, n_input + 1))
+        self.w_hidden_hidden = numpy.random.uniform(low=-1.0, high=1.0, size=(n_hidden, n_hidden + 1))
+        self.w_hidden_output = numpy.random.uniform(low=-1.0, high=1.0, size=(n_output, n_hidden + 1))
+
+    def serialize(self):
+        return {
+            'w_input_hidden': self.w_input_hidden,
+            'w_hidden_hidden': self.w_hidden_hidden,
+            'w_hidden_output': self.w_hidden_output,
+        }
+
+    def genome(self):
+        return numpy.concatenate([w_layer.ravel() for w_layer in self.serialize().values()])
+
+    def genome_shapes(self):
+        return {w_layer: v_weights.shape for w_layer, v_weights in self.serialize().items()}
+
+    @staticmethod
+    def from_genome(genome, genome_shapes=GENOME_SHAPES):
+        # the weight matrices are views into the genome, not copies
+        brain = Brain(0, 0, 0)
+        offset = 0
+        for w_layer, (rows, cols) in genome_shapes.items():
+            setattr(brain, w_layer, genome[offset:offset + rows * cols].reshape(rows, cols))
+            offset += rows * cols
+        return brain
+
+    @staticmethod
+    def activate(n):
+        return sigmoid(n)
+
+    @staticmethod
+    def mutate(vector, mutation_rate: float):
+        mutated = numpy.random.random(vector.shape) <= mutation_rate
+        return vector + numpy.where(mutated, numpy.random.uniform(-1.0, 1.0, vector.shape), 0)
+
+    @staticmethod
+    def crossover(v_a, v_b):
+        # the child takes v_a up to and including a random (row, col), then v_b
+        n_rows, n_cols = v_a.shape
+        r_row, r_col = random.randint(0, n_rows), random.randint(0, n_cols)
+        from_a = numpy.arange(n_rows * n_cols).reshape(n_rows, n_cols) <= r_row * n_cols + min(r_col, n_cols - 1)
+        return numpy.where(from_a, v_a, v_b)
+
+    def nn_process(self, v_input):
+        # normalize input vector; the last column of every weight matrix is the bias
+        v_input = numpy.asarray(v_input, dtype=float)
+        # v_input = normalize(v_input.reshape(1, -1)).reshape(-1, 1)
+
+        # results of layer-1 weights and input vector
+        v_input_hidden = self.activate(self.w_input_hidden[:, :-1].dot(v_input) + self.w_input_hidden[:, -1])
+
+        # results of layer-2 weights and layer-1 output
+        v_hidden_hidden = self.activate(self.w_hidden_hidden[:, :-1].dot(v_input_hidden) + self.w_hidden_hidden[:, -1])
+
+        # results of layer-3 weights and layer-2 output
+        v_hidden_output = self.activate(self.w_hidden_output[:, :-1].dot(v_hidden_hidden) + self.w_hidden_output[:, -1])
+
+        return numpy.atleast_2d(v_hidden_output).T
+
+    def sense(self, snake, fruit):
+        # the 24 input nodes, cast from precomputed rays over the snake's occupancy grid
+        return SENSORS.sense(head_cell=snake.cell, occupancy=snake.occupancy, fruit_cell=fruit.cell)
+
+    def decide(self, snake, fruit, nn_output=None, verbose=False):
+        # process input metrics through nn, unless a batched pass (PopulationBrain.forward) already did
+        if nn_output is None:
+            nn_inputs = self.sense(snake=snake, fruit=fruit)
+            nn_output = self.nn_process(nn_inputs)
+            if verbose:
+                print("Input values: {}".format([round(n, 6) for n in nn_inputs]))
+                print("Output values: {}".format([round(n[0], 6) for n in nn_output]))
+
+        # make directional decision
+        highest_node = int(numpy.argmax(nn_output))
+        return DECISIONS[highest_node]
+
+
+class Snake:
+    def __init__(self, start_coords=START_COORDS, color=None, brain=None):
+        self.x, self.y = start_coords
+        self.cell = grid_cell(self.x, self.y)
+
+        self.brain = brain
+        self.color = color
+
+        # body cells as a ring buffer starting at the head; the slot after the tail holds the last vacated cell
+        self.body = [self.cell] * BODY_CAPACITY
+        self.head = 0
+        self.length = 1
+
+        # number of body segments on each cell, plus the off-board cell, and the cells without one
+        self.occupancy = bytearray(N_CELLS + 1)
+        self.occupancy[self.cell] = 1
+        self.free = FreeCells(N_CELLS)
+        self.free.remove(self.cell)
+
+        self.time_lived = 0
+        self.tol = 200
+
+        if not color:
+            self.color = (random.randint(1, 255), random.randint(1, 255), random.randint(1, 255))
+        if not brain:
+            self.brain = Brain(n_input=N_INPUT, n_hidden=N_HIDDEN, n_output=N_OUTPUT)
+
+    def clone(self):
+        return Snake(color=self.color, brain=self.brain)
+
+    def cells(self):
+        return [self.body[(self.head + i) % BODY_CAPACITY] for i in range(self.length)]
+
+    def grow(self):
+        # the new tail segment takes the cell the tail just vacated
+        cell = self.body[(self.head + self.length) % BODY_CAPACITY]
+        self.occupancy[cell] += 1
+        if self.occupancy[cell] == 1:
+            self.free.remove(cell)
+        self.length += 1
+
+    def move(self, direction):
+        dx, dy = VELOCITIES[direction]
+        self.x, self.y = self.x + dx, self.y + dy
+
+        # push the new head cell; the old tail cell is left in the slot after the tail
+        self.cell = grid_cell(self.x, self.y)
+        self.head = (self.head - 1) % BODY_CAPACITY
+        self.body[self.head] = self.cell
+        self.occupancy[self.cell] += 1
+        if self.occupancy[self.cell] == 1 and self.cell != OFF_BOARD:
+            self.free.remove(self.cell)
+        vacated = self.body[(self.head + self.length) % BODY_CAPACITY]
+        self.occupancy[vacated] -= 1
+        if not self.occupancy[vacated] and vacated != OFF_BOARD:
+            self.free.add(vacated)
+
+    def print(self):
+        text = "~8~" + "<>~" * self.length
+        print(text)
+        return text
+
+    def size(self):
+        return self.length
+
+    def on_body(self, cell=None):
+        if cell is None:
+            # i must be my own head
+            return self.occupancy[self.cell] > 1
+        return self.occupancy[cell] > 0
+
+    def fitness(self):
+        return ((self.size() - 1) * 200) + (self.time_lived % 201)
+
+    def breed(self, partner_snake, mutation_rate: float):
+        # random color
+        child_color = random.choice([self.color, partner_snake.color])
+        child_color = ((child_color[0] + random.randint(-1, 1)) % 256,
+                       (child_color[1] + random.randint(-1, 1)) % 256,
+                       (child_color[2] + random.randint(-1, 1)) % 256)
+
+        # crossed brain
+        child_brain = Brain(0, 0, 0)
+        child_brain.w_input_hidden = Brain.crossover(v_a=self.brain.w_input_hidden, v_b=partner_snake.brain.w_input_hidden)
+        child_brain.w_hidden_hidden = Brain.crossover(v_a=self.brain.w_hidden_hidden, v_b=partner_snake.brain.w_hidden_hidden)
+        child_brain.w_hidden_output = Brain.crossover(v_a=self.brain.w_hidden_output, v_b=partner_snake.brain.w_hidden_output)
+
+        # mutate brain
+        child_brain.w_input_hidden = Brain.mutate(mutation_rate=mutation_rate, vector=child_brain.w_input_hidden)
+        child_brain.w_hidden_hidden = Brain.mutate(mutation_rate=mutation_rate, vector=child_brain.w_hidden_hidden)
+        child_brain.w_hidden_output = Brain.mutate(mutation_rate=mutation_rate, vector=child_brain.w_hidden_output)
+
+        # create snake
+        child_snake = Snake(color=child_color, brain=child_brain)
+
+        return child_snake
+
+
+def genome_size(genome_shapes) -> int:
+    return sum(rows * cols for rows, cols in genome_shapes.values())
+
+
+def out_of_bounds(x: int, y: int):
+    return x < 0 or x >= GRID_COLS or y < 0 or y >= GRID_ROWS
+
+
+def grid_cell(x: int, y: int) -> int:
+    if out_of_bounds(x, y):
+        return OFF_BOARD
+    return y * GRID_COLS + x
+
+
+def play_game(snake, renderer=None, replay=None) -> Snake:
+    # a replay's recorded decisions and fruit are played back instead of asking the brain and drawing fruit
+    if replay is not None:
+        decisions, fruits = iter(replay.decisions.tolist()), iter(replay.fruit.tolist())
+
+    # initial game fruit
+    fruit = Fruit(snake=snake, cell=next(fruits) if replay is not None else None)
+
+    # draw & display initial frame
+    if renderer:
+        print("\nSnake {} now playing".format(snake.color))
+        renderer.update(snake=snake, fruit=fruit, fps=5)
+
+    # play while snake is alive
+    while snake.tol > 0:
+        # move snake
+        if replay is not None:
+            snake.move(direction=DECISIONS[next(decisions)])
+        else:
+            snake.move(direction=snake.brain.decide(snake=snake, fruit=fruit, verbose=renderer is not None))
+
+        # did the snake eat the fruit?
+        if snake.on_body(cell=fruit.cell):
+            snake.grow()
+            # a snake filling the whole board has won, with no cell left for a fruit
+            if not len(snake.free):
+                break
+            fruit = Fruit(snake=snake, cell=next(fruits) if replay is not None else None)
+            snake.tol += 100
+        elif snake.size() < MIN_SNAKE_SIZE:
+            snake.grow()
+
+        # draw & display current frame
+        if renderer:
+            renderer.handle_events()
+            renderer.update(snake=snake, fruit=fruit, fps=15)
+
+        # did the snake collide with itself?
+        if snake.on_body() or out_of_bounds(snake.x, snake.y):
+            break
+
+        # advance frame
+        snake.time_lived += 1
+        snake.tol -= 1
+
+    return snake
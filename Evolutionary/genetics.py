@@ -0,0 +1,106 @@
+import math
+import numpy
+from game import Brain, Snake, GENOME_SHAPES, genome_size
+
+
+class Population:
+    def __init__(self, genomes, colors, genome_shapes=GENOME_SHAPES):
+        # one flat genome row laid out as genome_shapes and one RGB color per snake
+        self.genomes = genomes
+        self.colors = colors
+        self.genome_shapes = genome_shapes
+
+    @staticmethod
+    def random(size: int, rng, genome_shapes=GENOME_SHAPES):
+        genomes = rng.uniform(low=-1.0, high=1.0, size=(size, genome_size(genome_shapes)))
+        colors = rng.integers(1, 256, size=(size, 3))
+        return Population(genomes, colors, genome_shapes)
+
+    @staticmethod
+    def from_blueprint(brain, size: int, mutation_rate: float, rng):
+        # every snake is the blueprint bred with itself; blueprints keep their own hidden layer size
+        blueprint = Population(brain.genome()[numpy.newaxis], rng.integers(1, 256, size=(1, 3)), brain.genome_shapes())
+        parents = numpy.zeros(size, dtype=int)
+        return breed(blueprint, parents, parents, mutation_rate, rng)
+
+    def __len__(self):
+        return len(self.genomes)
+
+    def brain(self, index: int):
+        return Brain.from_genome(self.genomes[index].copy(), self.genome_shapes)
+
+    def snakes(self):
+        return [Snake(color=tuple(color), brain=Brain.from_genome(genome, self.genome_shapes)) for genome, color in zip(self.genomes, self.colors.tolist())]
+
+
+def crossover(genomes, parents_a, parents_b, rng, genome_shapes=GENOME_SHAPES, out=None):
+    # single-point crossover per layer: each child takes parent a's weights up to a random (row, col), as Brain.crossover
+    out = numpy.take(genomes, parents_b, axis=0, out=out)
+    offset = 0
+    for rows, cols in genome_shapes.values():
+        r_row = rng.integers(0, rows + 1, size=len(parents_a))
+        r_col = rng.integers(0, cols + 1, size=len(parents_a))
+        split = r_row * cols + numpy.minimum(r_col, cols - 1)
+
+        layer = slice(offset, offset + rows * cols)
+        from_a = numpy.arange(rows * cols) <= split[:, numpy.newaxis]
+        numpy.copyto(out[:, layer], genomes[:, layer][parents_a], where=from_a)
+        offset += rows * cols
+    return out
+
+
+def mutate(genomes, mutation_rate: float, rng):
+    # every weight independently gains uniform(-1, 1) noise with probability mutation_rate, in place;
+    # the gaps between mutated weights are geometric, so only the mutated positions are drawn
+    if mutation_rate <= 0:
+        return genomes
+    n_weights = genomes.size
+    expected = n_weights * mutation_rate
+    positions = numpy.cumsum(rng.geometric(mutation_rate, size=int(expected + 6 * math.sqrt(expected)) + 16)) - 1
+    while positions[-1] < n_weights:
+        positions = numpy.concatenate([positions, positions[-1] + numpy.cumsum(rng.geometric(mutation_rate, size=len(positions)))])
+    positions = positions[positions < n_weights]
+
+    rows, cols = numpy.divmod(positions, genomes.shape[1])
+    genomes[rows, cols] += rng.uniform(-1.0, 1.0, size=len(positions))
+    return genomes
+
+
+def breed(population, parents_a, parents_b, mutation_rate: float, rng, out=None):
+    # crossed and mutated brains, written into out (genomes, colors) when given
+    genomes_out, colors_out = out if out else (None, None)
+    genomes = crossover(population.genomes, parents_a, parents_b, rng, population.genome_shapes, out=genomes_out)
+    genomes = mutate(genomes, mutation_rate, rng)
+
+    # random parent color, nudged by -1..1 per channel
+    colors = numpy.where(rng.random((len(parents_a), 1)) < 0.5, population.colors[parents_a], population.colors[parents_b])
+    colors = numpy.remainder(colors + rng.integers(-1, 2, size=colors.shape), 256, out=colors_out)
+
+    return Population(genomes, colors, population.genome_shapes)
+
+
+def rank(fitness):
+    # snake indices by descending fitness; ties keep population order
+    return numpy.argsort(-numpy.asarray(fitness), kind='stable')
+
+
+def next_generation(population, fitness, breeding_threshold: float, mutation_rate: float, rng):
+    # breed the next gen of snakes - BREEDING ALGORITHM v3
+    # (1.0% alpha clones + 30.0% alpha-random pairs + remaining% random-random pairs)
+    size = len(population)
+    fittest = rank(fitness)[:math.floor(size * breeding_threshold)]
+    alpha = fittest[0]
+
+    n_clones = math.floor(size * 0.01)
+    n_alpha_pairs = math.floor(size * 0.30)
+    n_children = size - n_clones
+
+    parents_a = numpy.concatenate([numpy.full(n_alpha_pairs, alpha), rng.choice(fittest, size=n_children - n_alpha_pairs)])
+    parents_b = rng.choice(fittest, size=n_children)
+
+    # alpha clones first, then the children bred straight into the new arrays
+    offspring = Population(numpy.empty_like(population.genomes), numpy.empty_like(population.colors), population.genome_shapes)
+    offspring.genomes[:n_clones] = population.genomes[alpha]
+    offspring.colors[:n_clones] = population.colors[alpha]
+    breed(population, parents_a, parents_b, mutation_rate, rng, out=(offspring.genomes[n_clones:], offspring.colors[n_clones:]))
+    return offspring
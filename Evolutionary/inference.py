@@ -0,0 +1,106 @@
+import numpy
+
+# storage dtype of the genomes at each inference precision; int8 genomes are played as float32
+PRECISIONS = {'float64': numpy.float64, 'float32': numpy.float32, 'int8': numpy.int8}
+
+
+def sigmoid(x):
+    # array-wide logistic function; very negative inputs saturate to 0 instead of overflowing
+    with numpy.errstate(over='ignore'):
+        return 1 / (1 + numpy.exp(-x))
+
+
+def n_rows(genome_shapes) -> int:
+    # neurons in a genome, one int8 scale each
+    return sum(rows for rows, _ in genome_shapes.values())
+
+
+def quantize(genomes, genome_shapes):
+    # (population, genome size) int8 genomes and a (population, neurons) float32 scale per weight matrix row,
+    # the row's largest weight mapping to 127, so a row's weights are its int8 values times its scale
+    q = numpy.empty(genomes.shape, dtype=numpy.int8)
+    scales = numpy.empty((len(genomes), n_rows(genome_shapes)), dtype=numpy.float32)
+    offset, row = 0, 0
+    for rows, cols in genome_shapes.values():
+        layer = genomes[:, offset:offset + rows * cols].reshape(len(genomes), rows, cols)
+        scale = numpy.abs(layer).max(axis=2) / 127
+        scale[scale == 0] = 1
+        q[:, offset:offset + rows * cols] = numpy.rint(layer / scale[:, :, numpy.newaxis]).reshape(len(genomes), -1)
+        scales[:, row:row + rows] = scale
+        offset, row = offset + rows * cols, row + rows
+    return q, scales
+
+
+def dequantize(q, scales, genome_shapes):
+    # float32 genomes from quantize's int8 values and row scales
+    genomes = numpy.empty(q.shape, dtype=numpy.float32)
+    offset, row = 0, 0
+    for rows, cols in genome_shapes.values():
+        layer = q[:, offset:offset + rows * cols].reshape(len(q), rows, cols)
+        genomes[:, offset:offset + rows * cols] = (layer * scales[:, row:row + rows, numpy.newaxis]).reshape(len(q), -1)
+        offset, row = offset + rows * cols, row + rows
+    return genomes
+
+
+def compress(genomes, genome_shapes, precision: str):
+    # genomes as stored at precision, with the int8 row scales or None
+    if precision == 'int8':
+        return quantize(genomes, genome_shapes)
+    return genomes.astype(PRECISIONS[precision], copy=False), None
+
+
+class PopulationBrain:
+    def __init__(self, brains=None, w_input_hidden=None, w_hidden_hidden=None, w_hidden_output=None):
+        # stack the weight matrices of every brain into (population, rows, cols) arrays
+        if brains is not None:
+            w_input_hidden = numpy.stack([brain.w_input_hidden for brain in brains])
+            w_hidden_hidden = numpy.stack([brain.w_hidden_hidden for brain in brains])
+            w_hidden_output = numpy.stack([brain.w_hidden_output for brain in brains])
+        self.w_input_hidden = w_input_hidden
+        self.w_hidden_hidden = w_hidden_hidden
+        self.w_hidden_output = w_hidden_output
+
+    @staticmethod
+    def from_genomes(genomes, genome_shapes, scales=None):
+        # views into a (population, genome size) array of flat genomes laid out as genome_shapes; int8 genomes
+        # come with their row scales and are expanded to float32, the dtype every layer is then computed in
+        if scales is not None:
+            genomes = dequantize(genomes, scales, genome_shapes)
+        layers, offset = {}, 0
+        for w_layer, (rows, cols) in genome_shapes.items():
+            layers[w_layer] = genomes[:, offset:offset + rows * cols].reshape(len(genomes), rows, cols)
+            offset += rows * cols
+        return PopulationBrain(**layers)
+
+    def __len__(self):
+        return len(self.w_input_hidden)
+
+    def take(self, rows):
+        return PopulationBrain(
+            w_input_hidden=self.w_input_hidden[rows],
+            w_hidden_hidden=self.w_hidden_hidden[rows],
+            w_hidden_output=self.w_hidden_output[rows],
+        )
+
+    @staticmethod
+    def layer(weights, v):
+        # v is (population, batch, n_in); the last weight column is the bias
+        z = numpy.matmul(v, numpy.swapaxes(weights[:, :, :-1], 1, 2))
+        return sigmoid(z + weights[:, numpy.newaxis, :, -1])
+
+    def forward(self, v_inputs):
+        # v_inputs is (population, n_input), or (population, batch, n_input) for several games per brain
+        v = numpy.asarray(v_inputs, dtype=self.w_input_hidden.dtype)
+        single = v.ndim == 2
+        if single:
+            v = v[:, numpy.newaxis, :]
+
+        v = self.layer(self.w_input_hidden, v)
+        v = self.layer(self.w_hidden_hidden, v)
+        v = self.layer(self.w_hidden_output, v)
+
+        return v[:, 0, :] if single else v
+
+    def decide(self, v_inputs):
+        # index of the highest output node of every brain
+        return numpy.argmax(self.forward(v_inputs), axis=-1)
@@ -0,0 +1,145 @@
+import multiprocessing
+import os
+import queue
+import random
+import time
+import numpy
+from checkpoint import save_genetics
+from evaluation import VectorEvaluator
+from game import Brain
+from genetics import Population, next_generation, rank
+from telemetry import Telemetry
+
+
+# island constants
+ISLANDS = 4
+ISLAND_SIZE = 500
+MUTATION_RATE = 0.01
+BREEDING_THRESHOLD = 0.25
+MAX_GENERATIONS = 50
+MIGRATION_INTERVAL = 5  # generations between migrations; 0 keeps the islands isolated
+MIGRANTS = 10  # fittest genomes each island sends to the next island of the ring
+DONE = None  # last message of an island to the next one, after its final migrants
+
+
+def migrate(population, fitness, inbox):
+    # replace the least fit snakes with the migrants waiting in the inbox, without waiting for late ones;
+    # also returns whether the previous island has finished
+    arrived = 0
+    while True:
+        try:
+            migrants = inbox.get_nowait()
+        except queue.Empty:
+            return arrived, False
+        if migrants is DONE:
+            return arrived, True
+        genomes, colors, migrant_fitness = migrants
+        worst = rank(fitness)[len(fitness) - len(genomes):]
+        population.genomes[worst] = genomes
+        population.colors[worst] = colors
+        fitness[worst] = migrant_fitness
+        arrived += len(genomes)
+
+
+def run_island(island: int, seed, run_dir: str, inbox, outbox, reports):
+    # the select/breed cycle of engine.py on one island, sending its fittest snakes to the next island every MIGRATION_INTERVAL generations
+    rng = numpy.random.default_rng(seed)
+    population = Population.random(size=ISLAND_SIZE, rng=rng)
+    evaluator = VectorEvaluator()
+    telemetry = Telemetry(run_dir, 'metrics_island{}.jsonl'.format(island))
+    sigma = (None, None, None)
+    upstream_done = False
+
+    for generation in range(1, MAX_GENERATIONS + 1):
+        with telemetry.phase('evaluation'):
+            results = evaluator.evaluate(population.genomes)
+
+        with telemetry.phase('selection'):
+            fitness = numpy.array([result[0] for result in results])
+            alpha = rank(fitness)[0]
+            alpha_fitness, alpha_size, _ = results[alpha]
+            if sigma[0] is None or alpha_fitness > sigma[0]:
+                sigma = (alpha_fitness, alpha_size, population.genomes[alpha].copy())
+            gen_fitness = round(float(fitness.mean()), 2)
+
+        # the migrants of this generation can already be picked as parents; the last generation breeds no one to send them to
+        migrants_in = 0
+        if MIGRATION_INTERVAL and generation % MIGRATION_INTERVAL == 0 and generation < MAX_GENERATIONS:
+            with telemetry.phase('migration'):
+                fittest = rank(fitness)[:MIGRANTS]
+                outbox.put((population.genomes[fittest], population.colors[fittest], fitness[fittest]))
+                # a previous island that has already finished sends nothing after its DONE
+                if not upstream_done:
+                    migrants_in, upstream_done = migrate(population, fitness, inbox)
+
+        with telemetry.phase('breeding'):
+            population = next_generation(population, fitness, breeding_threshold=BREEDING_THRESHOLD, mutation_rate=MUTATION_RATE, rng=rng)
+
+        steps = evaluator.stats['steps']
+        telemetry.record(
+            generation,
+            island=island,
+            population_size=ISLAND_SIZE,
+            steps=steps,
+            steps_per_sec=round(steps / telemetry.phases['evaluation'], 1),
+            migrants_in=migrants_in,
+            gen_fitness=gen_fitness,
+            alpha_fitness=alpha_fitness,
+            alpha_size=alpha_size,
+        )
+        reports.put(('generation', island, generation, gen_fitness, alpha_fitness))
+
+    # shut down in step with the ring: tell the next island this one is done, then read the inbox up to the previous
+    # island's DONE, so every feeder thread can finish writing before its process exits
+    outbox.put(DONE)
+    while not upstream_done:
+        upstream_done = inbox.get() is DONE
+    reports.put(('done', island) + sigma)
+
+
+# begin island world
+if __name__ == '__main__':
+    _id = random.randint(10000, 99999)
+    run_dir = "snake_data/{}/".format(_id)
+    os.makedirs(run_dir, exist_ok=True)
+
+    print("\n-- Island world begin --")
+    print("ID: {}, islands: {}\n".format(_id, ISLANDS))
+    start_time = time.time()
+
+    # a ring of islands: each one's outbox is the next one's inbox
+    seeds = numpy.random.SeedSequence().spawn(ISLANDS)
+    inboxes = [multiprocessing.Queue() for _ in range(ISLANDS)]
+    reports = multiprocessing.Queue()
+    islands = [
+        multiprocessing.Process(target=run_island, args=(island, seeds[island], run_dir, inboxes[island], inboxes[(island + 1) % ISLANDS], reports))
+        for island in range(ISLANDS)
+    ]
+    for process in islands:
+        process.start()
+
+    # islands report in their own time; there is no barrier between them
+    done = {}
+    while len(done) < ISLANDS:
+        report = reports.get()
+        if report[0] == 'generation':
+            _, island, generation, gen_fitness, alpha_fitness = report
+            print("Island {}: generation={}, fitness={}, alpha fitness={}".format(island, generation, gen_fitness, alpha_fitness))
+        else:
+            _, island, alpha_fitness, alpha_size, genome = report
+            done[island] = (alpha_fitness, alpha_size, genome)
+    for process in islands:
+        process.join()
+
+    # report results
+    island, (alpha_fitness, alpha_size, genome) = max(done.items(), key=lambda item: item[1][0])
+    print("\n-- Island world complete --")
+    print("Parameters: id={}, islands={}, island size={}, max generations={}, migration interval={}, migrants={}".format(
+        _id, ISLANDS, ISLAND_SIZE, MAX_GENERATIONS, MIGRATION_INTERVAL, MIGRANTS
+    ))
+    print("Completed in {} seconds".format(round(time.time() - start_time, 2)))
+    print("Sigma: island={}, fitness={}, size={}".format(island, alpha_fitness, alpha_size))
+
+    # save results
+    save_genetics(run_dir, Brain.from_genome(genome).serialize())
+    print("Sigma genetics saved to '{}'.".format(run_dir))
@@ -0,0 +1,73 @@
+import glob
+import os
+import sys
+import time
+import numpy
+from checkpoint import load_blueprint
+from game import GENOME_SHAPES, N_INPUT, genome_size
+from inference import PRECISIONS, PopulationBrain, compress
+from vector_env import VectorGame
+
+# games played by each saved snake, and the population timed at each precision
+GAMES = 200
+POPULATION_SIZE = 2000
+
+
+def population_brain(genomes, genome_shapes, precision: str):
+    stored, scales = compress(genomes, genome_shapes, precision)
+    return PopulationBrain.from_genomes(stored, genome_shapes, scales), stored.nbytes + (0 if scales is None else scales.nbytes)
+
+
+def agreement(genome, genome_shapes, games: int, rng):
+    # share of the states a float64 snake meets in its own games where each precision makes the same decision
+    genomes = numpy.repeat(genome[numpy.newaxis], games, axis=0)
+    brains = {precision: population_brain(genomes, genome_shapes, precision)[0] for precision in PRECISIONS}
+    game = VectorGame(games, rng=rng)
+    agreed, states = dict.fromkeys(PRECISIONS, 0), 0
+    while game.alive.any():
+        live = numpy.flatnonzero(game.alive)
+        v_inputs = game.sense(live)
+        decisions = {precision: brain.take(live).decide(v_inputs) for precision, brain in brains.items()}
+        for precision in PRECISIONS:
+            agreed[precision] += int((decisions[precision] == decisions['float64']).sum())
+        states += len(live)
+        game.step(live, decisions['float64'])
+    return {precision: agreed[precision] / states for precision in PRECISIONS}, states
+
+
+def forward_time(population_size: int, rng):
+    # genome bytes and seconds of one batched decision, best of 5, for a random population at each precision
+    genomes = rng.uniform(-1.0, 1.0, size=(population_size, genome_size(GENOME_SHAPES)))
+    v_inputs = rng.random((population_size, N_INPUT))
+    timings = {}
+    for precision in PRECISIONS:
+        brain, n_bytes = population_brain(genomes, GENOME_SHAPES, precision)
+        best = float('inf')
+        for _ in range(5):
+            start = time.perf_counter()
+            brain.decide(v_inputs)
+            best = min(best, time.perf_counter() - start)
+        timings[precision] = (n_bytes, best)
+    return timings
+
+
+# measure how often float32 and int8 weights change the decisions of the saved snakes
+# usage: python precision.py [snake_data directory]
+if __name__ == '__main__':
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else 'snake_data'
+    rng = numpy.random.default_rng()
+    runs = sorted({os.path.dirname(path) for path in glob.glob(os.path.join(data_dir, '**', 'w_input_hidden.*'), recursive=True)})
+    totals, total_states = dict.fromkeys(PRECISIONS, 0.0), 0
+    for run_dir in runs:
+        brain = load_blueprint(run_dir)
+        rates, states = agreement(numpy.asarray(brain.genome()), brain.genome_shapes(), GAMES, rng)
+        for precision in PRECISIONS:
+            totals[precision] += rates[precision] * states
+        total_states += states
+        print("{}: {} states, agreement float32={}, int8={}".format(run_dir, states, round(rates['float32'], 5), round(rates['int8'], 5)))
+    if total_states:
+        print("All snakes: agreement float32={}, int8={}".format(round(totals['float32'] / total_states, 5), round(totals['int8'] / total_states, 5)))
+
+    print("\nPopulation of {}:".format(POPULATION_SIZE))
+    for precision, (n_bytes, seconds) in forward_time(POPULATION_SIZE, rng).items():
+        print("{}: {} genome bytes, {} ms per batched decision".format(precision, n_bytes, round(seconds * 1000, 3)))
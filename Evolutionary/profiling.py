@@ -0,0 +1,140 @@
+import collections
+import glob
+import marshal
+import os
+import pstats
+import signal
+import sys
+from multiprocessing import util
+
+PROFILE_DIR = 'profile'
+COMBINED = 'combined'
+
+
+class Profiler:
+    def __init__(self, interval: float, label: str, phase=None):
+        # samples the main thread's stack every interval seconds of wall time, so time blocked on the pool's pipes
+        # shows up too; a SIGALRM handler takes the samples, as a sampling thread only gets the GIL back mostly
+        # while numpy has released it. stacks are rooted at the label and the current phase, as pseudo frames
+        if not hasattr(signal, 'setitimer'):
+            raise RuntimeError("profiling needs signal.setitimer, which this platform lacks")
+        self.interval = interval
+        self.label = label
+        self.phase = phase
+        self.samples = collections.Counter()
+        self.root = None
+
+    def start(self, root=None):
+        # with a root frame, stacks stop there, so forked workers don't repeat the parent's frames
+        self.root = root
+        signal.signal(signal.SIGALRM, self.sample)
+        signal.setitimer(signal.ITIMER_REAL, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, signal.SIG_DFL)
+
+    def sample(self, signum, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+            frame = frame.f_back if frame is not self.root else None
+        roots = [('~', 0, '<{}>'.format(self.label))]
+        if self.phase:
+            roots.append(('~', 0, '<{}>'.format(self.phase)))
+        self.samples[tuple(roots + stack[::-1])] += 1
+
+    def save(self, profile_dir):
+        # this process's samples as <label>-<pid>.collapsed and .pstats in profile_dir
+        os.makedirs(profile_dir, exist_ok=True)
+        path = os.path.join(profile_dir, '{}-{}'.format(self.label, os.getpid()))
+        write_collapsed(path + '.collapsed', collapse(self.samples))
+        write_pstats(path + '.pstats', self.samples, self.interval)
+
+
+def frame_name(frame):
+    filename, line, name = frame
+    return name if filename == '~' else '{} ({}:{})'.format(name, os.path.basename(filename), line)
+
+
+def collapse(samples):
+    # root-to-leaf frame names joined by ';' and their sample counts, the input of flame graph tools
+    collapsed = collections.Counter()
+    for stack, count in samples.items():
+        collapsed[';'.join(frame_name(frame) for frame in stack)] += count
+    return collapsed
+
+
+def write_collapsed(path, collapsed):
+    with open(path, 'w') as f:
+        for stack, count in collapsed.most_common():
+            f.write('{} {}\n'.format(stack, count))
+
+
+def read_collapsed(path):
+    collapsed = collections.Counter()
+    with open(path) as f:
+        for line in f:
+            stack, count = line.rstrip('\n').rsplit(' ', 1)
+            collapsed[stack] += int(count)
+    return collapsed
+
+
+def write_pstats(path, samples, interval: float):
+    # the samples in the marshalled format pstats.Stats loads: a sample counts as a call, its leaf frame gets
+    # the interval as own time, and every frame on its stack gets it once as cumulative time
+    stats = {}
+    for stack, count in samples.items():
+        seconds = count * interval
+        for depth, frame in enumerate(stack):
+            primitive, calls, own, cumulative, callers = stats.get(frame, (0, 0, 0.0, 0.0, {}))
+            first = frame not in stack[:depth]
+            own += seconds if depth == len(stack) - 1 else 0.0
+            cumulative += seconds if first else 0.0
+            if depth:
+                caller = callers.get(stack[depth - 1], (0, 0, 0.0, 0.0))
+                callers[stack[depth - 1]] = (caller[0] + count, caller[1] + count, caller[2], caller[3] + seconds)
+            stats[frame] = (primitive + (count if first else 0), calls + count, own, cumulative, callers)
+    with open(path, 'wb') as f:
+        marshal.dump(stats, f)
+
+
+def init_worker(profile_dir, interval: float, initializer=None, *initargs):
+    # pool initializer: run the pool's own initializer, then sample this worker until it exits and save its profile;
+    # saved when the pool is closed and joined, not when it is terminated
+    if initializer is not None:
+        initializer(*initargs)
+    profiler = Profiler(interval, label='worker', phase='evaluation')
+    profiler.start(root=sys._getframe(1))
+    util.Finalize(profiler, _save_worker, args=(profiler, profile_dir), exitpriority=10)
+
+
+def _save_worker(profiler, profile_dir):
+    profiler.stop()
+    profiler.save(profile_dir)
+
+
+def merge(profile_dir):
+    # combine every process's profile in profile_dir into combined.pstats and combined.collapsed
+    paths = sorted(path for path in glob.glob(os.path.join(profile_dir, '*.pstats')) if not path.endswith(COMBINED + '.pstats'))
+    stats = pstats.Stats(*paths)
+    stats.dump_stats(os.path.join(profile_dir, COMBINED + '.pstats'))
+
+    collapsed = collections.Counter()
+    for path in paths:
+        collapsed.update(read_collapsed(path[:-len('.pstats')] + '.collapsed'))
+    write_collapsed(os.path.join(profile_dir, COMBINED + '.collapsed'), collapsed)
+    return stats, collapsed
+
+
+def breakdown(collapsed, names, root: str):
+    # share of the samples under root whose stack passes through each function or file name
+    frames = {stack: stack.split(';') for stack in collapsed if stack.startswith('<{}>'.format(root))}
+    total = sum(collapsed[stack] for stack in frames)
+    shares = {}
+    for name in names:
+        hits = sum(collapsed[stack] for stack, stack_frames in frames.items()
+                   if any(frame == name or frame.startswith(name + ' (') or '({}:'.format(name) in frame for frame in stack_frames))
+        shares[name] = hits / total if total else 0.0
+    return shares, total
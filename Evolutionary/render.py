@@ -0,0 +1,43 @@
+from time import sleep
+import pygame
+from game import GRID_COLS, GRID_ROWS
+
+# display constants
+COLOR_BLACK = 0, 0, 0
+COLOR_WHITE = 255, 255, 255
+BLOCK_SIZE = 30
+SCREEN_SIZE = SCREEN_WIDTH, SCREEN_HEIGHT = GRID_COLS * BLOCK_SIZE, GRID_ROWS * BLOCK_SIZE
+
+
+class Renderer:
+    def __init__(self):
+        pygame.init()
+        self.screen = pygame.display.set_mode(SCREEN_SIZE)
+
+    @staticmethod
+    def cell_rect(cell):
+        return pygame.Rect((cell % GRID_COLS) * BLOCK_SIZE, (cell // GRID_COLS) * BLOCK_SIZE, BLOCK_SIZE - 2, BLOCK_SIZE - 2)
+
+    def update(self, snake, fruit, fps):
+        self.screen.fill(COLOR_BLACK)
+        for cell in snake.cells():
+            pygame.draw.rect(self.screen, snake.color, self.cell_rect(cell))
+        pygame.draw.rect(self.screen, fruit.color, self.cell_rect(fruit.cell))
+        pygame.display.flip()
+        print("\nSnake coords: {}, {}".format(snake.x * BLOCK_SIZE, snake.y * BLOCK_SIZE))
+        print("Fruit coords: {}, {}".format(fruit.x * BLOCK_SIZE, fruit.y * BLOCK_SIZE))
+        sleep(1/fps)
+
+    @staticmethod
+    def handle_events():
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                exit(0)
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_SPACE:
+                    paused = True
+                    while paused:
+                        for event in pygame.event.get():
+                            if event.type == pygame.KEYDOWN:
+                                if event.key == pygame.K_SPACE:
+                                    paused = False
@@ -0,0 +1,108 @@
+import argparse
+import os
+import struct
+import sys
+import numpy
+from game import GRID_SIZE, Snake, play_game
+
+REPLAY_FILE = 'replays.bin'
+# generation, fitness, whether the fruit was seeded and its seed, board cols and rows, snake color, number of decisions and fruit
+HEADER = struct.Struct('<IIBQII3BII')
+SEED_LIMIT = 1 << 64  # fruit seeds are stored as unsigned 64-bit integers
+
+
+def cell_dtype(grid_size):
+    # fruit cells are stored in two bytes on boards of up to 65536 cells, in four on larger ones
+    cols, rows = grid_size
+    return '<u2' if cols * rows <= 1 << 16 else '<u4'
+
+
+class Replay:
+    def __init__(self, decisions, fruit, fitness: int, seed=None, generation: int = 0, color=(255, 255, 255), grid_size=GRID_SIZE):
+        # a game as the DECISIONS index of every frame and the cell of every fruit it was given, in order
+        self.decisions = numpy.asarray(decisions, dtype=numpy.uint8)
+        self.fruit = numpy.asarray(fruit, dtype=numpy.uint32)
+        self.fitness = fitness
+        self.seed = seed
+        self.generation = generation
+        self.color = color
+        self.grid_size = grid_size
+
+    def pack(self) -> bytes:
+        # the header, then four 2-bit decisions per byte, then the fruit cells
+        if self.seed is not None and not 0 <= self.seed < SEED_LIMIT:
+            raise ValueError("replays store fruit seeds of 0 to 2**64 - 1, not {}".format(self.seed))
+        codes = numpy.zeros(-(-len(self.decisions) // 4) * 4, dtype=numpy.uint8)
+        codes[:len(self.decisions)] = self.decisions
+        packed = numpy.bitwise_or.reduce(codes.reshape(-1, 4) << numpy.array([0, 2, 4, 6], dtype=numpy.uint8), axis=1)
+        header = HEADER.pack(
+            self.generation, self.fitness, self.seed is not None, self.seed or 0, *self.grid_size, *self.color,
+            len(self.decisions), len(self.fruit),
+        )
+        return header + packed.astype(numpy.uint8).tobytes() + self.fruit.astype(cell_dtype(self.grid_size)).tobytes()
+
+    @staticmethod
+    def unpack(buffer, offset: int = 0):
+        # the replay packed at offset, and the offset of the next one
+        generation, fitness, seeded, seed, cols, rows, r, g, b, n_decisions, n_fruit = HEADER.unpack_from(buffer, offset)
+        offset += HEADER.size
+        packed = numpy.frombuffer(buffer, dtype=numpy.uint8, count=-(-n_decisions // 4), offset=offset)
+        decisions = ((packed[:, numpy.newaxis] >> numpy.array([0, 2, 4, 6], dtype=numpy.uint8)) & 3).reshape(-1)[:n_decisions]
+        offset += len(packed)
+        fruit = numpy.frombuffer(buffer, dtype=cell_dtype((cols, rows)), count=n_fruit, offset=offset)
+        offset += fruit.nbytes
+        replay = Replay(decisions, fruit, fitness, seed if seeded else None, generation, (r, g, b), (cols, rows))
+        return replay, offset
+
+
+def append_replay(run_dir, replay):
+    with open(os.path.join(run_dir, REPLAY_FILE), 'ab') as f:
+        f.write(replay.pack())
+
+
+def truncate_replays(run_dir, generation: int):
+    # drop the replays of the generations after generation, as resuming from its checkpoint records them again
+    path = os.path.join(run_dir, REPLAY_FILE)
+    if not os.path.exists(path):
+        return
+    with open(path + '.tmp', 'wb') as f:
+        for replay in load_replays(run_dir):
+            if replay.generation <= generation:
+                f.write(replay.pack())
+    os.replace(path + '.tmp', path)
+
+
+def load_replays(run_dir):
+    with open(os.path.join(run_dir, REPLAY_FILE), 'rb') as f:
+        buffer = f.read()
+    replays, offset = [], 0
+    while offset < len(buffer):
+        replay, offset = Replay.unpack(buffer, offset)
+        replays.append(replay)
+    return replays
+
+
+# watch a recorded alpha game straight from a run's replay log, without its brain
+if __name__ == '__main__':
+    from engine import DATA_DIR
+    from render import Renderer
+
+    parser = argparse.ArgumentParser(description="Play back a run's recorded alpha game; the fittest one by default.")
+    parser.add_argument('id', help="id of the run, as its path under the data directory")
+    parser.add_argument('generation', nargs='?', type=int, help="generation whose alpha game to play")
+    parser.add_argument('--data-dir', default=DATA_DIR, help="directory of the run directories")
+    args = parser.parse_args()
+
+    replays = load_replays(os.path.join(args.data_dir, args.id))
+    if args.generation is not None:
+        replay = next((replay for replay in replays if replay.generation == args.generation), None)
+        if replay is None:
+            sys.exit("No replay of generation {} was recorded.".format(args.generation))
+    else:
+        replay = max(replays, key=lambda replay: replay.fitness)
+    if tuple(replay.grid_size) != GRID_SIZE:
+        sys.exit("Replay was recorded on a {}x{} board; set SNAKE_GRID_SIZE to match.".format(*replay.grid_size))
+
+    print("Generation {}: {} decisions, {} fruit, recorded fitness={}".format(replay.generation, len(replay.decisions), len(replay.fruit), replay.fitness))
+    snake = play_game(Snake(color=replay.color), renderer=Renderer(), replay=replay)
+    print("Replayed fitness={}".format(snake.fitness()))
@@ -0,0 +1,70 @@
+import numpy
+
+
+class RayCaster:
+    def __init__(self, cols: int, rows: int, directions):
+        self.cols, self.rows = cols, rows
+        self.n_cells = cols * rows
+
+        # rays are walked from the head cell when sensing: the k-th cell of a ray is the head plus k grid steps, so only
+        # the number of in-bound cells along every ray is kept, two bytes for each cell and direction
+        directions = list(directions)
+        self.steps = [dy * cols + dx for dx, dy in directions]
+        y, x = numpy.divmod(numpy.arange(self.n_cells), cols)
+        far = max(cols, rows)
+        self.lengths = numpy.stack([
+            numpy.minimum(
+                far if dx == 0 else (cols - 1 - x if dx > 0 else x),
+                far if dy == 0 else (rows - 1 - y if dy > 0 else y),
+            ) for dx, dy in directions
+        ], axis=1).astype(numpy.uint16)
+
+        # for the batched variant: the grid steps of every direction, and each step along a ray with its distance metric
+        ray_width = max(1, far - 1)
+        self.v_steps = numpy.array(self.steps, dtype=numpy.intp)
+        self.reach = numpy.arange(1, ray_width + 1)
+        self.distance = 1.0 / self.reach
+
+    def sense(self, head_cell: int, occupancy, fruit_cell: int):
+        # the 24 input nodes - INPUT METRIC ALGORITHM v2.3
+        nn_inputs = []
+
+        # the fruit metric only depends on whether the fruit is under the body, not on the ray
+        fruit_on_body = occupancy[fruit_cell] > 0
+
+        for length, step in zip(self.lengths[head_cell].tolist(), self.steps):
+            x_fruit, x_snake = 0, 0
+
+            # distance to the first body segment in this direction
+            for distance in range(1, length + 1):
+                if occupancy[head_cell + distance * step]:
+                    x_snake = 1.0 / distance
+                    break
+
+            if fruit_on_body and length:
+                x_fruit = 1.0
+
+            nn_inputs.append(x_fruit)
+            nn_inputs.append(x_snake)
+            nn_inputs.append(1.0 / (length + 1))
+
+        return nn_inputs
+
+    def sense_batch(self, head_cells, occupancy, fruit_cells, rows=None):
+        # head_cells and fruit_cells are (games,), occupancy is (games, n_cells + 1), or a larger
+        # array whose rows for these games are given by rows; returns (games, 24)
+        head_cells = numpy.asarray(head_cells)
+        games = numpy.arange(len(head_cells)) if rows is None else numpy.asarray(rows)
+        games = games[:, numpy.newaxis]
+
+        # the cells of every ray, padded past its end with the off-board cell, which a live snake never occupies
+        lengths = self.lengths[head_cells].astype(numpy.intp)
+        cells = head_cells[:, numpy.newaxis, numpy.newaxis] + self.v_steps[:, numpy.newaxis] * self.reach
+        cells = numpy.where(self.reach <= lengths[:, :, numpy.newaxis], cells, self.n_cells)
+        hits = occupancy[games, cells.reshape(len(head_cells), -1)].reshape(cells.shape) > 0
+        x_snake = numpy.where(hits.any(axis=2), self.distance[hits.argmax(axis=2)], 0.0)
+
+        fruit_on_body = occupancy[games[:, 0], fruit_cells] > 0
+        x_fruit = (fruit_on_body[:, numpy.newaxis] & (lengths > 0)).astype(float)
+
+        return numpy.stack([x_fruit, x_snake, 1.0 / (lengths + 1)], axis=2).reshape(len(head_cells), -1)
@@ -0,0 +1,175 @@
+import argparse
+import collections
+import os
+import random
+import time
+import numpy
+from checkpoint import save_genetics
+from evaluation import SharedPoolEvaluator
+from game import GENOME_SHAPES
+from genetics import Population, breed
+from telemetry import Telemetry
+
+
+# steady-state constants
+POPULATION_SIZE = 2000
+MUTATION_RATE = 0.01
+TOURNAMENT_SIZE = 5
+MAX_EVALUATIONS = POPULATION_SIZE * 50  # as many games as 50 generations of main.py
+REPORT_INTERVAL = POPULATION_SIZE  # evaluations between progress reports
+BATCH_SIZE = 50  # children bred together and played in lockstep shards; single children would each pay a task and a scalar game
+IN_FLIGHT = 2  # batches on the pool at once, so the workers play one while the next is bred
+
+
+class SteadyState:
+    def __init__(self, population_size: int, mutation_rate: float, tournament_size: int, processes=None,
+                 batch_size: int = BATCH_SIZE, in_flight: int = IN_FLIGHT, seed=None):
+        # a population of played snakes; children are bred a batch at a time and played as soon as a batch slot is free,
+        # so workers never wait on a generation. the initial population is played in the first shared rows, then each
+        # batch in flight has its own slot of batch_size rows. with a seed, the initial population, the tournaments,
+        # the breeding and the fruit of every batch are drawn from it, so a run can be replayed exactly
+        self.population_size = population_size
+        self.mutation_rate = mutation_rate
+        self.tournament_size = tournament_size
+        self.batch_size = batch_size
+        self.in_flight = in_flight
+        self.rng = numpy.random.default_rng(seed)
+        self.fruit_rng = None if seed is None else numpy.random.default_rng(numpy.random.SeedSequence(seed).spawn(1)[0])
+        self.evaluator = SharedPoolEvaluator(max(population_size, in_flight * batch_size), GENOME_SHAPES, processes=processes, vectorized=True)
+        self.processes = self.evaluator.processes
+        # batches on the pool, in the order they were submitted and are taken back
+        self.in_progress = collections.deque()
+
+        # the genomes of the played snakes, and the fitness their games scored
+        self.population = None
+        self.fitness = numpy.zeros(population_size)
+        self.sizes = numpy.zeros(population_size, dtype=int)
+        self.evaluations = 0
+        self.replacements = 0
+        self.busy_seconds = 0.0
+
+    def tournaments(self, n: int):
+        # the fittest of tournament_size random members, n times over
+        entrants = self.rng.integers(0, len(self.population), size=(n, self.tournament_size))
+        return entrants[numpy.arange(n), numpy.argmax(self.fitness[entrants], axis=1)]
+
+    def fruit_seed(self):
+        return None if self.fruit_rng is None else int(self.fruit_rng.integers(2 ** 32))
+
+    def submit(self, slot: int):
+        # breed a batch of children into the slot's rows and queue their shards
+        children = breed(self.population, self.tournaments(self.batch_size), self.tournaments(self.batch_size), self.mutation_rate, self.rng)
+        offset = slot * self.batch_size
+        genome_bytes = self.evaluator.write(children.genomes, offset)
+        tasks = self.evaluator.tasks(len(children), self.fruit_seed(), offset=offset)
+        self.in_progress.append((slot, children, tasks, self.evaluator.pool.map_async(self.evaluator.play, tasks), genome_bytes))
+
+    def seed(self):
+        # play the random initial population, the only point where every worker is waited on
+        self.population = Population.random(self.population_size, self.rng)
+        results = self.evaluator.evaluate(self.population.genomes, seed=self.fruit_seed())
+        for index, (fitness, size, _) in enumerate(results):
+            self.fitness[index], self.sizes[index] = fitness, size
+        self.busy_seconds += self.evaluator.stats['busy_seconds']
+        self.evaluations += self.population_size
+
+    def step(self):
+        # take the oldest batch, waiting for it if needed, so children replace members in the order they were bred;
+        # each child replaces the least fit member if it beats it, and a new batch takes its slot
+        slot, children, tasks, replies, genome_bytes = self.in_progress.popleft()
+        results, stats, _, _ = self.evaluator.collect(tasks, replies.get(), genome_bytes, slot * self.batch_size)
+        self.evaluations += len(children)
+        self.busy_seconds += stats['busy_seconds']
+
+        for child, (fitness, size, _) in enumerate(results):
+            worst = numpy.argmin(self.fitness)
+            if fitness > self.fitness[worst]:
+                self.population.genomes[worst] = children.genomes[child]
+                self.population.colors[worst] = children.colors[child]
+                self.fitness[worst], self.sizes[worst] = fitness, size
+                self.replacements += 1
+        self.submit(slot)
+
+    def run(self, evaluations: int, report=None):
+        # report(steady_state) is called each time the evaluations pass a multiple of REPORT_INTERVAL
+        self.seed()
+        for slot in range(self.in_flight):
+            self.submit(slot)
+        while self.evaluations < evaluations:
+            reported = self.evaluations // REPORT_INTERVAL
+            self.step()
+            if report and self.evaluations // REPORT_INTERVAL > reported:
+                report(self)
+
+    def alpha(self):
+        # the fittest snake's brain with its fitness and size
+        alpha = numpy.argmax(self.fitness)
+        return self.population.brain(alpha), int(self.fitness[alpha]), int(self.sizes[alpha])
+
+    def close(self):
+        # batches still in flight are dropped
+        self.evaluator.pool.terminate()
+        self.evaluator.close()
+
+
+# begin steady-state world
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Evolve snakes without generations, breeding children from tournament winners.")
+    parser.add_argument('--seed', type=int, help="seed of the initial population, the tournaments, the breeding and the fruit; a run is replayed exactly from it")
+    args = parser.parse_args()
+
+    _id = random.randint(10000, 99999)
+    run_dir = "snake_data/{}/".format(_id)
+    os.makedirs(run_dir, exist_ok=True)
+    telemetry = Telemetry(run_dir)
+
+    print("\n-- Steady-state world begin --")
+    print("ID: {}\n".format(_id))
+    start_time = time.time()
+    last = {'time': time.time(), 'evaluations': 0, 'busy_seconds': 0.0}
+
+    def report(steady_state):
+        # one metrics record per REPORT_INTERVAL evaluations, the steady-state counterpart of a generation
+        now = time.time()
+        seconds = now - last['time']
+        evaluations = steady_state.evaluations - last['evaluations']
+        utilisation = (steady_state.busy_seconds - last['busy_seconds']) / (seconds * steady_state.processes)
+        last.update(time=now, evaluations=steady_state.evaluations, busy_seconds=steady_state.busy_seconds)
+
+        _, alpha_fitness, alpha_size = steady_state.alpha()
+        gen_fitness = round(float(steady_state.fitness.mean()), 2)
+        print("Evaluations: {}, fitness={}, alpha fitness={}, evaluations/sec={}, worker utilisation={}".format(
+            steady_state.evaluations, gen_fitness, alpha_fitness, round(evaluations / seconds, 1), round(utilisation, 3)
+        ))
+        telemetry.record(
+            steady_state.evaluations // REPORT_INTERVAL,
+            backend='steady_state',
+            evaluations=steady_state.evaluations,
+            evaluations_per_sec=round(evaluations / seconds, 1),
+            processes=steady_state.processes,
+            worker_utilisation=round(utilisation, 3),
+            replacements=steady_state.replacements,
+            gen_fitness=gen_fitness,
+            alpha_fitness=alpha_fitness,
+            alpha_size=alpha_size,
+        )
+
+    steady_state = SteadyState(POPULATION_SIZE, mutation_rate=MUTATION_RATE, tournament_size=TOURNAMENT_SIZE, seed=args.seed)
+    steady_state.run(MAX_EVALUATIONS, report=report)
+    steady_state.close()
+
+    # report results
+    alpha, alpha_fitness, alpha_size = steady_state.alpha()
+    seconds = time.time() - start_time
+    print("\n-- Steady-state world complete --")
+    print("Parameters: id={}, population size={}, mutation rate={}, tournament size={}, evaluations={}, seed={}".format(
+        _id, POPULATION_SIZE, MUTATION_RATE, TOURNAMENT_SIZE, steady_state.evaluations, args.seed
+    ))
+    print("Completed in {} seconds, {} evaluations/sec, {} children kept".format(
+        round(seconds, 2), round(steady_state.evaluations / seconds, 1), steady_state.replacements
+    ))
+    print("Sigma: fitness={}, size={}".format(alpha_fitness, alpha_size))
+
+    # save results
+    save_genetics(run_dir, alpha.serialize())
+    print("Sigma genetics saved to '{}'.".format(run_dir))
@@ -0,0 +1,234 @@
+import argparse
+import csv
+import itertools
+import multiprocessing
+import os
+import queue
+import random
+import time
+import numpy
+from checkpoint import load_blueprint, save_genetics
+from engine import DATA_DIR, Config, Engine
+from evaluation import SharedPoolEvaluator
+from game import GENOME_SHAPES
+
+
+# sweep constants; every key is a Config parameter and every world runs one combination of the values
+SWEEP_GRID = {
+    'mutation_rate': [0.005, 0.01, 0.02],
+    'breeding_threshold': [0.1, 0.25],
+    'population_size': [1000, 2000],
+}
+RANDOM_WORLDS = 0  # worlds drawn uniformly within each parameter's range in SWEEP_GRID instead of the full grid; 0 runs the grid
+WORLDS_IN_FLIGHT = 4  # worlds evaluated at once on the shared pool, each in its own slot of the shared genome rows
+MAX_GENERATIONS = 20
+RESULTS_FILE = 'results.csv'
+RESULT_COLUMNS = ['world_fitness', 'world_fitness_roc', 'sigma_generation', 'sigma_fitness', 'sigma_size',
+                  'seconds', 'evaluation_seconds', 'breeding_seconds', 'busy_seconds']
+
+
+def grid(params):
+    # every combination of the values, in the order of the keys
+    return [dict(zip(params, values)) for values in itertools.product(*params.values())]
+
+
+def random_search(params, n_worlds: int, rng):
+    # n_worlds draws between each parameter's smallest and largest value; integer parameters stay integers,
+    # and other values are picked from the list
+    worlds = []
+    for _ in range(n_worlds):
+        world = {}
+        for name, values in params.items():
+            if all(isinstance(value, int) for value in values):
+                world[name] = int(rng.integers(min(values), max(values) + 1))
+            elif all(isinstance(value, (int, float)) for value in values):
+                world[name] = float(rng.uniform(min(values), max(values)))
+            else:
+                world[name] = values[rng.integers(len(values))]
+        worlds.append(world)
+    return worlds
+
+
+class World:
+    def __init__(self, number: int, config, shared, slot: int, capacity: int):
+        # one world of the sweep: its engine's evaluator, playing its genomes from row slot * capacity of the shared block
+        self.number = number
+        self.shared = shared
+        self.slot = slot
+        self.offset = slot * capacity
+        self.replays = {}
+        self.busy_seconds = 0.0
+        self.started = None
+        # with a world seed, each generation's games take their fruit seed from a stream of it apart from breeding's,
+        # so the world replays the same games from --seed alone; a fixed evaluation_seed still applies to every generation
+        self.fruit_rng = None if config.seed is None else numpy.random.default_rng(numpy.random.SeedSequence(config.seed).spawn(1)[0])
+        self.engine = Engine(config, log=self.log, evaluator=self)
+
+    def log(self, line: str):
+        if line.strip():
+            print("[world {}] {}".format(self.number, line.strip()))
+
+    def start(self, finished):
+        self.started = time.perf_counter()
+        self.engine.start()
+        self.submit(finished)
+
+    def submit(self, finished):
+        # begin the engine's next generation and queue its games; finished receives the replies, or the error
+        self.engine.begin()
+        genomes = self.engine.population.genomes
+        genome_bytes = self.shared.write(genomes, self.offset)
+        seed = self.engine.config.evaluation_seed
+        if seed is None and self.fruit_rng is not None:
+            seed = int(self.fruit_rng.integers(2 ** 32))
+        tasks = self.shared.tasks(len(genomes), seed, self.offset)
+        submitted = time.perf_counter()
+        self.shared.pool.map_async(
+            self.shared.play, tasks,
+            callback=lambda replies: finished.put((self, tasks, replies, genome_bytes, time.perf_counter() - submitted)),
+            error_callback=finished.put,
+        )
+
+    def advance(self, tasks, replies, genome_bytes: int, seconds: float):
+        # select and breed the evaluated generation; False once the world has run all its generations.
+        # its evaluation time runs from submitting the games to their last reply, including time queued behind other worlds
+        results, stats, _, self.replays = self.shared.collect(tasks, replies, genome_bytes, self.offset)
+        self.busy_seconds += stats['busy_seconds']
+        self.engine.telemetry.add('evaluation', seconds)
+        self.engine.advance(results, stats)
+        return self.engine.generation < self.engine.config.max_generations
+
+    def finish(self):
+        summary = self.engine.finish()
+        summary.update(
+            seconds=round(time.perf_counter() - self.started, 3),
+            evaluation_seconds=summary['timings'].get('evaluation'),
+            breeding_seconds=summary['timings'].get('breeding'),
+            busy_seconds=round(self.busy_seconds, 3),
+        )
+        return summary
+
+    def close(self):
+        # the slot is handed to the next world by the sweep
+        pass
+
+
+def sweep(configs, processes=None, worlds_in_flight: int = WORLDS_IN_FLIGHT):
+    # run every config as a world, worlds_in_flight at a time, with the games of all of them on one pool: while a world
+    # breeds, the others' games keep the workers busy. the worlds share the backend, episodes, precision, blueprint and
+    # replay settings of the first config. returns each world's summary in config order, and the sigma genetics of the fittest
+    base = configs[0]
+    if base.evaluation_backend not in ('shared', 'sharded'):
+        raise ValueError("a sweep evaluates on the 'shared' or 'sharded' pool, not {!r}".format(base.evaluation_backend))
+    genome_shapes = load_blueprint('{}/{}/'.format(base.data_dir, base.blueprint_snake_id)).genome_shapes() if base.blueprint_snake_id else GENOME_SHAPES
+    capacity = max(config.population_size for config in configs)
+    slots = min(worlds_in_flight, len(configs))
+    shared = SharedPoolEvaluator(population_size=slots * capacity, processes=processes, vectorized=base.evaluation_backend == 'sharded',
+                                 genome_shapes=genome_shapes, episodes=base.episodes, precision=base.inference_precision, record=base.record_replays)
+
+    finished = queue.Queue()
+    pending = list(enumerate(configs))
+    free_slots = list(range(slots))
+    summaries, sigma = {}, (None, None)
+    try:
+        running = 0
+        while pending or running:
+            # a freed slot goes to the next world
+            while pending and free_slots:
+                number, config = pending.pop(0)
+                World(number, config, shared, free_slots.pop(0), capacity).start(finished)
+                running += 1
+
+            reply = finished.get()
+            if isinstance(reply, BaseException):
+                raise reply
+            world = reply[0]
+            if world.advance(*reply[1:]):
+                world.submit(finished)
+                continue
+            summaries[world.number] = world.finish()
+            if sigma[0] is None or summaries[world.number]['sigma_fitness'] > sigma[0]:
+                sigma = (summaries[world.number]['sigma_fitness'], world.engine.sigma[1])
+            free_slots.append(world.slot)
+            running -= 1
+    finally:
+        shared.close()
+    return [summaries[number] for number in range(len(configs))], sigma[1]
+
+
+def parse_value(text: str):
+    # an int, a float, or else the text itself
+    for kind in (int, float):
+        try:
+            return kind(text)
+        except ValueError:
+            pass
+    return text
+
+
+def write_results(path, params, summaries):
+    # one row per world: its parameters and seed, then its results
+    names = [name for name in params[0] if name != 'seed']
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['world', 'id', 'seed'] + names + RESULT_COLUMNS)
+        for number, (world, summary) in enumerate(zip(params, summaries)):
+            writer.writerow([number, summary['id'], world['seed']] + [world[name] for name in names] + [summary[column] for column in RESULT_COLUMNS])
+
+
+# begin sweep
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a grid or random search of worlds with their games on one shared worker pool.")
+    parser.add_argument('--param', action='append', default=[], metavar='NAME=V1,V2,...',
+                        help="values of a Config parameter, replacing SWEEP_GRID's when it has the same name; repeatable")
+    parser.add_argument('--random', type=int, default=RANDOM_WORLDS, help="draw this many worlds within the parameter ranges instead of the grid")
+    parser.add_argument('--generations', type=int, default=MAX_GENERATIONS, help="generations of every world")
+    parser.add_argument('--workers', type=int, help="worker processes of the shared pool (default: every core)")
+    parser.add_argument('--worlds-in-flight', type=int, default=WORLDS_IN_FLIGHT, help="worlds evaluated at once")
+    parser.add_argument('--backend', choices=('shared', 'sharded'), default='sharded', help="evaluation backend of the shared pool")
+    parser.add_argument('--blueprint', help="id of a saved snake every world breeds its first generation from, as its path under the data directory (e.g. IMA-v1/15862)")
+    parser.add_argument('--seed', type=int, help="seed the worlds' seeds and random draws come from")
+    parser.add_argument('--data-dir', default=DATA_DIR, help="directory of the run directories")
+    parser.add_argument('--start-method', choices=multiprocessing.get_all_start_methods(), help="how worker processes are started")
+    args = parser.parse_args()
+    if args.start_method:
+        multiprocessing.set_start_method(args.start_method)
+
+    params = dict(SWEEP_GRID)
+    for param in args.param:
+        name, values = param.split('=', 1)
+        params[name] = [parse_value(value) for value in values.split(',')]
+    sweep_seed = args.seed if args.seed is not None else random.getrandbits(32)
+    rng = numpy.random.default_rng(sweep_seed)
+    worlds = random_search(params, args.random, rng) if args.random else grid(params)
+    for world, seed in zip(worlds, numpy.random.SeedSequence(sweep_seed).generate_state(len(worlds)).tolist()):
+        world['seed'] = seed
+    configs = [Config(max_generations=args.generations, evaluation_backend=args.backend, blueprint_snake_id=args.blueprint, data_dir=args.data_dir, **world)
+               for world in worlds]
+
+    _id = random.randint(10000, 99999)
+    sweep_dir = "{}/{}/".format(args.data_dir, _id)
+    os.makedirs(sweep_dir, exist_ok=True)
+    print("\n-- Sweep begin --")
+    print("ID: {}, worlds: {}, seed: {}\n".format(_id, len(worlds), sweep_seed))
+    start_time = time.perf_counter()
+    summaries, sigma_genetics = sweep(configs, processes=args.workers, worlds_in_flight=args.worlds_in_flight)
+    seconds = time.perf_counter() - start_time
+    processes = args.workers or os.cpu_count()
+
+    # report results, fittest worlds first
+    print("\n-- Sweep complete --")
+    print("Completed in {} seconds, worker utilisation={}".format(
+        round(seconds, 2), round(sum(summary['busy_seconds'] for summary in summaries) / (seconds * processes), 3)
+    ))
+    for number in sorted(range(len(worlds)), key=lambda number: -summaries[number]['world_fitness']):
+        world, summary = worlds[number], summaries[number]
+        print("World {} (id={}, {}): fitness={}, sigma generation={}, sigma fitness={}, {} seconds".format(
+            number, summary['id'], ", ".join("{}={}".format(name, value) for name, value in world.items() if name != 'seed'),
+            summary['world_fitness'], summary['sigma_generation'], summary['sigma_fitness'], summary['seconds']
+        ))
+
+    # save results; every world's sigma is also in its own run directory
+    write_results(os.path.join(sweep_dir, RESULTS_FILE), worlds, summaries)
+    save_genetics(sweep_dir, sigma_genetics)
+    print("Results and the fittest sigma's genetics saved to '{}'.".format(sweep_dir))
@@ -0,0 +1,70 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows; peak RSS is reported as None there
+    resource = None
+
+METRICS_FILE = 'metrics.jsonl'
+
+
+def peak_rss_mb():
+    # peak resident set size of this process in MB (ru_maxrss is in KB on Linux)
+    if resource is None:
+        return None
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+class Telemetry:
+    def __init__(self, run_dir, filename=METRICS_FILE, profiler=None):
+        # one JSON record per generation, appended so resumed runs continue the same stream;
+        # a profiler's samples are tagged with the phase being timed
+        self.path = os.path.join(run_dir, filename)
+        self.phases = {}
+        self.profiler = profiler
+
+    @contextmanager
+    def phase(self, name: str):
+        # time a block of the current generation under name
+        outer = self.profiler.phase if self.profiler else None
+        if self.profiler:
+            self.profiler.phase = name
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+            if self.profiler:
+                self.profiler.phase = outer
+
+    def add(self, name: str, seconds: float):
+        # seconds of the current generation spent under name, for phases timed elsewhere
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def truncate(self, generation: int):
+        # drop the records after generation, which a run resumed from that generation's checkpoint plays again
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            records = [line for line in f if line.strip() and json.loads(line)['generation'] <= generation]
+        with open(self.path + '.tmp', 'w') as f:
+            f.writelines(records)
+        os.replace(self.path + '.tmp', self.path)
+
+    def record(self, generation: int, **fields):
+        record = {
+            'generation': generation,
+            'time': round(time.time(), 3),
+            'phases': {name: round(seconds, 4) for name, seconds in self.phases.items()},
+            **fields,
+            'peak_rss_mb': peak_rss_mb(),
+        }
+        # flushed per generation so long runs can be followed live
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+        self.phases = {}
+        return record
@@ -0,0 +1,181 @@
+import numpy
+from game import BODY_CAPACITY, DECISIONS, GRID_COLS, GRID_ROWS, MIN_SNAKE_SIZE, N_CELLS, N_INPUT, OFF_BOARD, SENSORS, START_COORDS, VELOCITIES
+from replay import Replay
+
+# fruit cells pre-drawn per evaluation seed and episode; each game walks its episode's schedule from the start
+FRUIT_SCHEDULE = 4096
+FRUIT_DRAWS = 8  # random cells tried for a fruit before drawing among the game's free cells directly
+# frames of decisions a recording VectorGame allocates at a time, and the filler of frames a game didn't play
+RECORD_FRAMES = 256
+NO_DECISION = 255
+
+# grid step of each nn output node
+DX = numpy.array([VELOCITIES[decision][0] for decision in DECISIONS])
+DY = numpy.array([VELOCITIES[decision][1] for decision in DECISIONS])
+
+
+class VectorGame:
+    def __init__(self, n_brains: int, rng=None, seed=None, episodes: int = 1, record=False):
+        # episodes games of play_game per brain advanced in lockstep; every array has one row per game,
+        # and game g is episode g % episodes of brain g // episodes
+        self.rng = rng if rng is not None else numpy.random.default_rng()
+        self.seed = seed
+        self.episodes = episodes
+        n_games = self.n_games = n_brains * episodes
+        # with a seed every brain's k-th episode draws its fruit from the same schedule, so a game's outcome depends only on its brain
+        self.schedule = None if seed is None else numpy.random.default_rng(seed).integers(0, N_CELLS, size=(episodes, FRUIT_SCHEDULE))
+        self.draws = numpy.zeros(n_games, dtype=int)
+        start_cell = START_COORDS[1] * GRID_COLS + START_COORDS[0]
+
+        self.x = numpy.full(n_games, START_COORDS[0])
+        self.y = numpy.full(n_games, START_COORDS[1])
+        self.cell = numpy.full(n_games, start_cell)
+
+        # ring-buffer bodies and occupancy grids, laid out like Snake's
+        self.body = numpy.full((n_games, BODY_CAPACITY), start_cell)
+        self.head = numpy.zeros(n_games, dtype=int)
+        self.length = numpy.ones(n_games, dtype=int)
+        self.occupancy = numpy.zeros((n_games, N_CELLS + 1), dtype=numpy.uint8)
+        self.occupancy[:, start_cell] = 1
+
+        self.time_lived = numpy.zeros(n_games, dtype=int)
+        self.tol = numpy.full(n_games, 200)
+        self.alive = numpy.ones(n_games, dtype=bool)
+
+        # with record, the decision of every game in every frame, and the games given fruit with their cells
+        self.frame = 0
+        self.decisions = numpy.full((RECORD_FRAMES, n_games), NO_DECISION, dtype=numpy.uint8) if record else None
+        self.fruit_log = []
+
+        self.fruit = numpy.full(n_games, start_cell)
+        self.place_fruit(numpy.arange(n_games))
+
+    def place_fruit(self, games):
+        # uniform over the free cells of each game, like Fruit: random cells while they keep landing on the body, then
+        # for the few games left a draw among their free cells, so a crowded board costs one pass over it.
+        # returns which of the games have no free cell left and get no fruit
+        missing = games
+        for _ in range(FRUIT_DRAWS):
+            if not len(missing):
+                break
+            self.fruit[missing] = self.draw(missing)
+            missing = missing[self.occupancy[missing, self.fruit[missing]] > 0]
+        full = numpy.zeros(len(games), dtype=bool)
+        if len(missing):
+            # the k-th free cell of each game, with k scaled from a draw over all the cells
+            free = self.occupancy[missing, :N_CELLS] == 0
+            counts = free.sum(axis=1)
+            full[numpy.isin(games, missing[counts == 0])] = True
+            missing, free, counts = missing[counts > 0], free[counts > 0], counts[counts > 0]
+            picks = self.draw(missing) * counts // N_CELLS
+            self.fruit[missing] = numpy.argmax(free.cumsum(axis=1) > picks[:, None], axis=1)
+        if self.decisions is not None and len(games):
+            placed = games[~full]
+            self.fruit_log.append((placed, self.fruit[placed]))
+        return full
+
+    def draw(self, games):
+        # a random cell for each game, from its episode's schedule when seeded
+        if self.schedule is None:
+            return self.rng.integers(0, N_CELLS, size=len(games))
+        cells = self.schedule[games % self.episodes, self.draws[games] % FRUIT_SCHEDULE]
+        self.draws[games] += 1
+        return cells
+
+    def sense(self, games):
+        return SENSORS.sense_batch(self.cell[games], self.occupancy, self.fruit[games], rows=games)
+
+    def step(self, games, decisions):
+        # advance the given live games by one frame of play_game
+        if self.decisions is not None:
+            if self.frame == len(self.decisions):
+                self.decisions = numpy.concatenate([self.decisions, numpy.full_like(self.decisions, NO_DECISION)])
+            self.decisions[self.frame, games] = decisions
+        self.frame += 1
+
+        head_x = self.x[games] + DX[decisions]
+        head_y = self.y[games] + DY[decisions]
+        out = (head_x < 0) | (head_x >= GRID_COLS) | (head_y < 0) | (head_y >= GRID_ROWS)
+        cell = numpy.where(out, OFF_BOARD, head_y * GRID_COLS + head_x)
+        self.x[games], self.y[games], self.cell[games] = head_x, head_y, cell
+
+        # move: push the new head cell, leave the old tail cell in the slot after the tail
+        head = (self.head[games] - 1) % BODY_CAPACITY
+        self.head[games] = head
+        self.body[games, head] = cell
+        self.occupancy[games, cell] += 1
+        vacated = self.body[games, (head + self.length[games]) % BODY_CAPACITY]
+        self.occupancy[games, vacated] -= 1
+
+        # did the snake eat the fruit? either way, short snakes keep growing
+        ate = cell == self.fruit[games]
+        grow = ate | (self.length[games] < MIN_SNAKE_SIZE)
+        self.occupancy[games[grow], vacated[grow]] += 1
+        self.length[games[grow]] += 1
+        self.tol[games[ate]] += 100
+        full = numpy.zeros(len(games), dtype=bool)
+        full[ate] = self.place_fruit(games[ate])
+
+        # did the snake collide with itself or leave the board? a snake filling the whole board has won and stops too
+        dead = out | (self.occupancy[games, cell] > 1) | full
+        self.alive[games[dead]] = False
+
+        # advance frame
+        games = games[~dead]
+        self.time_lived[games] += 1
+        self.tol[games] -= 1
+        self.alive[games] = self.tol[games] > 0
+
+    def run(self, brain, max_steps=None):
+        # play every game with its row of the PopulationBrain until all are dead, or for max_steps frames;
+        # the episodes of a brain share its forward pass as one (episodes, n_input) batch
+        active, active_brain = numpy.arange(len(brain)), brain
+        steps = 0
+        while self.alive.any() and (max_steps is None or steps < max_steps):
+            games = numpy.flatnonzero(self.alive)
+            brains, episodes = numpy.divmod(games, self.episodes)
+
+            # drop brains without live games from the batched forward pass once they are the majority
+            live = brains[numpy.concatenate([[True], brains[1:] != brains[:-1]])]
+            if len(live) <= len(active) // 2:
+                active, active_brain = live, active_brain.take(numpy.searchsorted(active, live))
+
+            v_inputs = numpy.zeros((len(active), self.episodes, N_INPUT))
+            rows = numpy.searchsorted(active, brains)
+            v_inputs[rows, episodes] = self.sense(games)
+            decisions = active_brain.decide(v_inputs)[rows, episodes]
+
+            self.step(games, decisions)
+            steps += 1
+        return steps
+
+    def fitness(self):
+        return ((self.length - 1) * 200) + (self.time_lived % 201)
+
+    def steps(self):
+        # frames played, summed over every episode of every brain
+        return int(self.time_lived.sum())
+
+    def fitness_variance(self):
+        # variance of each brain's fitness over its episodes
+        return self.fitness().reshape(-1, self.episodes).var(axis=1)
+
+    def replay(self, game: int):
+        # game as a Replay; a game plays from the first frame until it stops, so its decisions are a prefix
+        decisions = self.decisions[:self.frame, game]
+        decisions = decisions[:numpy.count_nonzero(decisions != NO_DECISION)]
+        fruit = [cells[games == game][0] for games, cells in self.fruit_log if game in games]
+        return Replay(decisions, fruit, int(self.fitness()[game]), seed=self.seed)
+
+    def alpha_replay(self):
+        # the fittest brain by its results, with the replay of its best episode
+        fitness = self.fitness().reshape(-1, self.episodes)
+        brain = int(numpy.argmax(fitness.mean(axis=1)))
+        return brain, self.replay(brain * self.episodes + int(numpy.argmax(fitness[brain])))
+
+    def results(self):
+        # (fitness, size, time lived) per brain, as returned by the evaluators; means over the episodes of each brain
+        if self.episodes == 1:
+            return list(zip(self.fitness().tolist(), self.length.tolist(), self.time_lived.tolist()))
+        means = [values.reshape(-1, self.episodes).mean(axis=1).tolist() for values in (self.fitness(), self.length, self.time_lived)]
+        return list(zip(*means))
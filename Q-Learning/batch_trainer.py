@@ -0,0 +1,184 @@
+import time
+import numpy as np
+from main import Game, action_map, action_space, alpha, block_size, epsilon, gamma, height, max_iterations, q_table, width
+from q_table import encode_states
+
+# grid step of each action, in action_map order
+STEPS = {"right": (1, 0), "left": (-1, 0), "up": (0, -1), "down": (0, 1)}
+DX = np.array([STEPS[action][0] for action in action_map])
+DY = np.array([STEPS[action][1] for action in action_map])
+n_envs = 256  # games played in lockstep by the batched trainer
+
+
+class BatchGame:
+    def __init__(self, n_envs, rng=None):
+        # n_envs games of main.Game in lockstep, on grid cells; a finished game is reset in place
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.n_envs = n_envs
+        self.cols, self.rows = width // block_size, height // block_size
+        self.n_cells = self.cols * self.rows
+        self.capacity = self.n_cells + 2
+        self.envs = np.arange(n_envs)
+
+        self.x = np.zeros(n_envs, dtype=int)
+        self.y = np.zeros(n_envs, dtype=int)
+        # bodies as ring buffers starting at the head, and the number of body segments on each cell
+        self.body = np.zeros((n_envs, self.capacity), dtype=int)
+        self.head = np.zeros(n_envs, dtype=int)
+        self.length = np.zeros(n_envs, dtype=int)
+        self.occupancy = np.zeros((n_envs, self.n_cells), dtype=np.int16)
+        # each game's cells without a body segment, as Snake keeps them: free_cells[env, :n_free[env]] in any order,
+        # with free_position[env, cell] the index of cell in free_cells[env]
+        self.free_cells = np.zeros((n_envs, self.n_cells), dtype=int)
+        self.free_position = np.zeros((n_envs, self.n_cells), dtype=int)
+        self.n_free = np.zeros(n_envs, dtype=int)
+
+        self.size = np.zeros(n_envs, dtype=int)
+        self.score = np.zeros(n_envs, dtype=int)
+        self.tol = np.zeros(n_envs, dtype=int)
+        self.fruit = np.zeros(n_envs, dtype=int)
+        self.reset(self.envs)
+
+    def reset(self, envs):
+        # a new Snake and Food in the given games
+        self.x[envs], self.y[envs] = self.cols // 2, self.rows // 2
+        start = self.rows // 2 * self.cols + self.cols // 2
+        self.body[envs, 0] = start
+        self.head[envs] = 0
+        self.length[envs] = 1
+        self.occupancy[envs] = 0
+        self.occupancy[envs, start] = 1
+        self.free_cells[envs] = np.arange(self.n_cells)
+        self.free_position[envs] = np.arange(self.n_cells)
+        self.n_free[envs] = self.n_cells
+        self.take(envs, np.full(len(envs), start))
+        self.size[envs] = 1
+        self.score[envs] = 0
+        self.tol[envs] = 200
+        self.place_fruit(envs)
+
+    def place_fruit(self, envs):
+        # uniform over the cells off the body, like Food, from each game's free cells; returns which of the games
+        # have none left and get no fruit
+        full = self.n_free[envs] == 0
+        envs = envs[~full]
+        self.fruit[envs] = self.free_cells[envs, (self.rng.random(len(envs)) * self.n_free[envs]).astype(int)]
+        return full
+
+    def take(self, envs, cells):
+        # cells that just got their first body segment, one per game
+        self.n_free[envs] -= 1
+        self.swap_free(envs, cells, self.n_free[envs])
+
+    def release(self, envs, cells):
+        # cells that just lost their last body segment, one per game
+        self.swap_free(envs, cells, self.n_free[envs])
+        self.n_free[envs] += 1
+
+    def swap_free(self, envs, cells, index):
+        # Snake.swap_free in every given game at once
+        other = self.free_cells[envs, index]
+        position = self.free_position[envs, cells]
+        self.free_cells[envs, position], self.free_cells[envs, index] = other, cells
+        self.free_position[envs, other], self.free_position[envs, cells] = position, index
+
+    def head_cells(self):
+        out = (self.x < 0) | (self.x >= self.cols) | (self.y < 0) | (self.y >= self.rows)
+        return np.where(out, self.n_cells, self.y * self.cols + self.x)
+
+    def states(self):
+        # keys of every game's state, as Game.get_current_state: head, fruit and every body segment but body[0]
+        body_mask = self.occupancy.copy()
+        body_mask[self.envs, self.body[self.envs, self.head]] -= 1
+        return encode_states(self.head_cells(), self.fruit, body_mask > 0)
+
+    def step(self, actions):
+        # one Game.execute_action in every game; returns the rewards and the games that ended
+        self.x += DX[actions]
+        self.y += DY[actions]
+        self.tol -= 1
+        cell = self.head_cells()
+        out = cell == self.n_cells
+
+        # Snake.move checks the body without its tail
+        tail = self.body[self.envs, (self.head + self.length - 1) % self.capacity]
+        hits = self.occupancy[self.envs, np.where(out, 0, cell)] - (tail == cell)
+        dead = (self.tol == 0) | out | (hits > 0)
+
+        # push the new head, then drop the tail unless the snake is growing
+        envs = self.envs[~dead]
+        self.head[envs] = (self.head[envs] - 1) % self.capacity
+        self.body[envs, self.head[envs]] = cell[envs]
+        self.occupancy[envs, cell[envs]] += 1
+        entered = self.occupancy[envs, cell[envs]] == 1
+        self.take(envs[entered], cell[envs[entered]])
+        self.length[envs] += 1
+        envs = envs[self.length[envs] > self.size[envs]]
+        tail = self.body[envs, (self.head[envs] + self.length[envs] - 1) % self.capacity]
+        self.occupancy[envs, tail] -= 1
+        left = self.occupancy[envs, tail] == 0
+        self.release(envs[left], tail[left])
+        self.length[envs] -= 1
+
+        # check for collision with food; a snake that ran out of time can still land on it
+        ate = self.envs[cell == self.fruit]
+        self.size[ate] += 1
+        self.score[ate] = self.size[ate]
+        self.tol[ate] = 200
+        won = ate[self.place_fruit(ate)]
+
+        rewards = np.zeros(self.n_envs)
+        rewards[ate] = 10
+        rewards[dead] = -10
+        # a snake filling the whole board has won and its game ends
+        dead[won] = True
+        return rewards, dead
+
+
+class BatchTrainer:
+    def __init__(self, q_table, n_envs, rng=None):
+        self.q_table = q_table
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.game = BatchGame(n_envs, rng=self.rng)
+
+    def train(self, episodes):
+        # play until episodes games have ended; returns their scores in the order they ended
+        scores = []
+        states = self.game.states()
+        while len(scores) < episodes:
+            # epsilon-greedy actions for every game at once, from the rows the update below writes; reading
+            # new_states adds no state, so the rows stay put in between
+            rows = self.q_table.rows(states)
+            explore = self.rng.random(self.game.n_envs) < epsilon
+            actions = np.where(explore, self.rng.integers(0, action_space, size=self.game.n_envs), np.argmax(self.q_table.values[rows], axis=1))
+
+            rewards, dead = self.game.step(actions)
+            new_states = self.game.states()
+            targets = rewards + gamma * self.q_table.lookup(new_states).max(axis=1)
+            self.q_table.update(rows, actions, targets, alpha)
+
+            # restart the games that ended
+            ended = np.flatnonzero(dead)
+            if len(ended):
+                scores.extend(self.game.score[ended].tolist())
+                self.game.reset(ended)
+                new_states = self.game.states()
+            states = new_states
+        return scores[:episodes]
+
+
+if __name__ == "__main__":
+    # the current one-game loop against the batched trainer, each for max_iterations episodes
+    start_time = time.time()
+    for _ in range(max_iterations):
+        Game().play()
+    loop_rate = max_iterations / (time.time() - start_time)
+    print("Game loop: {} episodes/sec".format(round(loop_rate, 1)))
+
+    start_time = time.time()
+    scores = BatchTrainer(q_table, n_envs).train(max_iterations)
+    batch_rate = max_iterations / (time.time() - start_time)
+    print("Batched trainer ({} games): {} episodes/sec, {}x the game loop, mean score {}".format(
+        n_envs, round(batch_rate, 1), round(batch_rate / loop_rate, 2), round(float(np.mean(scores)), 2)
+    ))
+    print("Q-table: {} states, {} bytes".format(len(q_table), q_table.nbytes()))
@@ -0,0 +1,53 @@
+import sys
+import pygame
+
+# Define colors
+black = (0, 0, 0)
+green = (0, 255, 0)
+red = (255, 0, 0)
+white = (255, 255, 255)
+
+
+# Define the Display class
+class Display:
+    def __init__(self, width, height, block_size, fps=None, frame_skip=1):
+        # the window only exists once a Display is created; fps=None draws without waiting
+        pygame.init()
+        self.window = pygame.display.set_mode((width, height))
+        self.clock = pygame.time.Clock()
+        self.block_size = block_size
+        self.fps = fps
+        self.frame_skip = frame_skip
+        self.frames = 0
+
+        # the font and the score text are built once, not every frame
+        self.font = pygame.font.Font(None, 30)
+        self.score = None
+        self.score_text = None
+
+    def frame(self, snake, fruit):
+        # draw every frame_skip-th frame
+        self.frames += 1
+        if self.frames % self.frame_skip:
+            return
+        self.handle_events()
+
+        self.window.fill(black)
+        pygame.draw.rect(self.window, red, (fruit.x, fruit.y, self.block_size, self.block_size))
+        for segment in snake.body:
+            pygame.draw.rect(self.window, green, (segment[0], segment[1], self.block_size, self.block_size))
+        if snake.score != self.score:
+            self.score = snake.score
+            self.score_text = self.font.render("Score: " + str(snake.score), True, white)
+        self.window.blit(self.score_text, (0, 0))
+        pygame.display.update()
+
+        if self.fps:
+            self.clock.tick(self.fps)
+
+    @staticmethod
+    def handle_events():
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                sys.exit()
@@ -1,46 +1,52 @@
-import sys
 import numpy as np
-import pygame
 import random
+from q_table import QTable, encode_state, key_size
 
-# Initialize the game
-pygame.init()
-
-# Set up the window
+# Set up the board
 block_size = 30
-width = height = 10 * block_size
-map_blocks = (width * height) // block_size
-window = pygame.display.set_mode((width, height))
-show_graphics = False
-
-# Set up the clock
-clock = pygame.time.Clock()
+grid_cols = grid_rows = 10  # board size in cells
+width, height = grid_cols * block_size, grid_rows * block_size
+n_cells = grid_cols * grid_rows  # also the head cell of a snake that left the board
 
-# Define colors
-black = (0, 0, 0)
-green = (0, 255, 0)
-red = (255, 0, 0)
-white = (255, 255, 255)
+# Set up the display; pygame is only loaded when show_graphics is on
+show_graphics = False
+render_every = 100  # show every Nth game
+frame_skip = 1  # draw every Nth frame of a shown game
+render_fps = 10  # frames per second of a shown game; None draws as fast as it trains
 
 # Q-Learning parameters
-state_space = map_blocks * map_blocks  # possible states: head position, fruit position, body positions
 action_space = 4  # left, right, up, down
 alpha = 0.1  # learning rate
 gamma = 0.9  # discount factor
 epsilon = 0.1  # exploration rate
 max_iterations = 1000  # max number of moves?
-q_table = np.zeros((state_space, action_space))  # state-action table
+max_states = None  # cap on the visited states kept in the Q-table; None keeps them all
+q_table = QTable(action_space, key_size(n_cells), max_states=max_states)  # state-action table, keyed by packed head, fruit and body cells
 action_map = ["right", "left", "up", "down"]
 
+# Checkpointing
+checkpoint_dir = "q_table_data"
+checkpoint_interval = 100  # games between Q-table checkpoints; 0 disables them
+warm_start = False  # continue training from the checkpoint in checkpoint_dir
+eval_only = False  # play greedily from the checkpoint without learning or saving
+
 
 # Define the Snake class
 class Snake:
     def __init__(self):
-        self.x = 5 * block_size
-        self.y = 5 * block_size
+        self.x = grid_cols // 2 * block_size
+        self.y = grid_rows // 2 * block_size
         self.velocity = block_size
         self.direction = "right"
         self.body = [(self.x, self.y)]
+
+        # body segments on each cell, as a growing snake can step onto its own tail, and the cells without one:
+        # free_cells[:n_free] in any order, with free_position[cell] the index of cell in free_cells
+        self.segments = [0] * n_cells
+        self.free_cells = list(range(n_cells))
+        self.free_position = list(range(n_cells))
+        self.n_free = n_cells
+        self.occupy(self.x, self.y)
         self.is_alive = True
         self.size = 1
         self.score = 0
@@ -72,12 +78,34 @@ class Snake:
             return
 
         self.body.insert(0, (self.x, self.y))
+        self.occupy(self.x, self.y)
         if len(self.body) > self.size:
-            self.body.pop()
-
-    def draw(self, window):
-        for segment in self.body:
-            pygame.draw.rect(window, green, (segment[0], segment[1], block_size, block_size))
+            self.vacate(*self.body.pop())
+
+    def occupy(self, x, y):
+        cell = x // block_size + y // block_size * grid_cols
+        self.segments[cell] += 1
+        if self.segments[cell] == 1:
+            self.n_free -= 1
+            self.swap_free(cell, self.n_free)
+
+    def vacate(self, x, y):
+        cell = x // block_size + y // block_size * grid_cols
+        self.segments[cell] -= 1
+        if not self.segments[cell]:
+            self.swap_free(cell, self.n_free)
+            self.n_free += 1
+
+    def swap_free(self, cell, index):
+        # a cell is taken or freed by swapping it with the one at index, across the boundary at n_free
+        other = self.free_cells[index]
+        position = self.free_position[cell]
+        self.free_cells[position], self.free_cells[index] = other, cell
+        self.free_position[other], self.free_position[cell] = position, index
+
+    def free_cell(self):
+        # a uniformly random cell without a body segment
+        return self.free_cells[random.randrange(self.n_free)]
 
 
 # define the Food class
@@ -87,39 +115,32 @@ class Food:
         self.generate_food()
 
     def generate_food(self):
-        while True:
-            self.x = random.randint(0, width - block_size) // block_size * block_size
-            self.y = random.randint(0, height - block_size) // block_size * block_size
-            if (self.x, self.y) not in self.snake.body:
-                break
-
-    def draw(self, window):
-        pygame.draw.rect(window, red, (self.x, self.y, block_size, block_size))
+        # uniform over the cells off the body, drawn from the snake's free cells
+        row, col = divmod(self.snake.free_cell(), grid_cols)
+        self.x, self.y = col * block_size, row * block_size
 
 
 # Define the Game class
 class Game:
-    def __init__(self):
-        # Create the snake and food objects
+    def __init__(self, display=None, learn=True):
+        # Create the snake and food objects; a game with a display draws its frames there,
+        # and a game that doesn't learn plays greedily without updating the Q-table
         self.snake = Snake()
         self.fruit = Food(snake=self.snake)
+        self.display = display
+        self.learn = learn
 
     def play(self):
+        current_state = self.get_current_state()
         while self.snake.is_alive:
-            # handle events
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-
-            # decide action
-            current_state = self.get_current_state()
-            if random.uniform(0, 1) < epsilon:
+            # decide action; a learning game looks up the row it updates once, as reading new_state adds no state
+            q_values = q_table.row(current_state) if self.learn else q_table.get(current_state)
+            if self.learn and random.uniform(0, 1) < epsilon:
                 # Choose a random action
                 action = random.choice(range(action_space))
             else:
                 # Choose the action with the highest expected reward
-                action = np.argmax(q_table[current_state, :])
+                action = np.argmax(q_values)
 
             # execute action and collect reward
             reward = self.execute_action(action)
@@ -128,8 +149,10 @@ class Game:
             new_state = self.get_current_state()
 
             # Update the Q-table based on the observed reward and the maximum expected reward for the new state
-            q_table[current_state, action] = q_table[current_state, action] + alpha * (
-                        reward + gamma * np.max(q_table[new_state, :]) - q_table[current_state, action])
+            if self.learn:
+                q_values[action] = q_values[action] + alpha * (
+                            reward + gamma * np.max(q_table.get(new_state)) - q_values[action])
+            current_state = new_state
 
         return self.snake.score
 
@@ -138,31 +161,31 @@ class Game:
         reward = 0
 
         # move snake
-        self.snake.direction = action
+        self.snake.direction = action_map[action]
         self.snake.move()
 
         # check for collision with food
+        won = False
         if self.snake.x == self.fruit.x and self.snake.y == self.fruit.y:
             self.snake.size += 1
             self.snake.score = self.snake.size
-            self.fruit = Food(snake=self.snake)
             self.snake.tol = 200
             reward = 10
 
+            # a snake filling the whole board has won, with no cell left for food
+            won = not self.snake.n_free
+            if won:
+                self.snake.is_alive = False
+            else:
+                self.fruit = Food(snake=self.snake)
+
         # check for death; bad snake!
-        if not self.snake.is_alive:
+        if not self.snake.is_alive and not won:
             reward = -10
 
         # update display?
-        if show_graphics:
-            window.fill(black)
-            self.fruit.draw(window)
-            self.snake.draw(window)
-            font = pygame.font.Font(None, 30)
-            score_text = font.render("Score: " + str(self.snake.score), True, white)
-            window.blit(score_text, (0, 0))
-            pygame.display.update()
-            clock.tick(10)
+        if self.display:
+            self.display.frame(self.snake, self.fruit)
 
         return reward
 
@@ -177,24 +200,47 @@ class Game:
         body_positions = self.snake.body[1:]
 
         # Convert the head, fruit, and body positions to state indices
-        head_state = head_x // block_size + head_y // block_size * 10
-        fruit_state = fruit_x // block_size + fruit_y // block_size * 10
-        body_states = [pos[0] // block_size + pos[1] // block_size * 10 for pos in body_positions]
+        head_state = head_x // block_size + head_y // block_size * grid_cols
+        if not (0 <= head_x < width and 0 <= head_y < height):
+            head_state = n_cells
+        fruit_state = fruit_x // block_size + fruit_y // block_size * grid_cols
+        body_states = [pos[0] // block_size + pos[1] // block_size * grid_cols for pos in body_positions]
 
-        # Concatenate the head, fruit, and body state indices to form the current state
-        state = (head_state, fruit_state, tuple(body_states))
+        # Pack the head, fruit, and body state indices into the current state's key
+        state = encode_state(head_state, fruit_state, body_states, n_cells)
 
         return state
 
 
 def main():
-    for iteration in range(max_iterations):
-        game = Game()
+    global q_table
+    first_game = 0
+    if warm_start or eval_only:
+        q_table, meta = QTable.open(checkpoint_dir, read_only=eval_only)
+        first_game = meta['games']
+        print("Loaded {} states from '{}' after {} games.".format(len(q_table), checkpoint_dir, first_game))
+
+    display = None
+    if show_graphics:
+        from display import Display
+        display = Display(width, height, block_size, fps=render_fps, frame_skip=frame_skip)
+
+    scores = []
+    for iteration in range(first_game, first_game + max_iterations):
+        game = Game(display=display if iteration % render_every == 0 else None, learn=not eval_only)
         score = game.play()
+        scores.append(score)
         print("Game #{} finished with score: {}".format(iteration, score))
 
+        if not eval_only and checkpoint_interval and (iteration + 1) % checkpoint_interval == 0:
+            q_table.checkpoint(checkpoint_dir, games=iteration + 1)
+
+    if eval_only:
+        print("Evaluation complete: mean score {}".format(np.mean(scores)))
+        return
+    q_table.checkpoint(checkpoint_dir, games=first_game + max_iterations)
     print("Training complete.")
-    print(q_table)
+    print("Q-table: {} states, {} bytes".format(len(q_table), q_table.nbytes()))
 
 
 if __name__ == "__main__":
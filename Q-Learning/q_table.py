@@ -0,0 +1,287 @@
+import json
+import os
+import numpy as np
+from collections import OrderedDict
+
+# a Q-table checkpoint: meta.json names the snapshot in use, whose arrays are saved as <array>.<snapshot>.npy
+ARRAYS = ('values', 'keys', 'hashes', 'slots')
+META_FILE = 'meta.json'
+
+# keys hash to their value modulo a Mersenne prime, spread over the slots by Fibonacci hashing
+HASH_PRIME = (1 << 31) - 1
+FIBONACCI = 0x9E3779B97F4A7C15
+MASK_64 = (1 << 64) - 1
+# batched lookups probe one key at a time once fewer than this many are left
+PROBE_BATCH = 16
+
+
+def key_size(n_cells):
+    # bytes in the key of a state on a board of n_cells
+    return 4 + (n_cells + 7) // 8
+
+
+def encode_state(head, fruit, body, n_cells):
+    # pack the head cell, the fruit cell and a bitmask of the body cells into a bytes key;
+    # laid out as a row of encode_states, which packs a batch
+    body_mask = 0
+    for cell in body:
+        body_mask |= 1 << cell
+    return head.to_bytes(2, 'little') + fruit.to_bytes(2, 'little') + body_mask.to_bytes((n_cells + 7) // 8, 'little')
+
+
+def encode_states(heads, fruits, body_masks):
+    # keys of a batch of states as a (batch, key size) uint8 array; body_masks is a (batch, n_cells) boolean array
+    return np.concatenate([
+        heads.astype('<u2').view(np.uint8).reshape(-1, 2),
+        fruits.astype('<u2').view(np.uint8).reshape(-1, 2),
+        np.packbits(body_masks, axis=1, bitorder='little'),
+    ], axis=1)
+
+
+def key_hash(key):
+    return int.from_bytes(key, 'little') % HASH_PRIME
+
+
+def key_hashes(keys):
+    # key_hash of every row of a (batch, key size) uint8 array: the rows read as little-endian 32-bit words,
+    # each weighted by its place value modulo the prime
+    n_words = -(-keys.shape[1] // 4)
+    words = np.zeros((len(keys), 4 * n_words), dtype=np.uint8)
+    words[:, :keys.shape[1]] = keys
+    weights = np.array([pow(2, 32 * word, HASH_PRIME) for word in range(n_words)], dtype=np.uint64)
+    return (words.view('<u4').astype(np.uint64) * weights % HASH_PRIME).sum(axis=1) % HASH_PRIME
+
+
+def read_meta(path):
+    with open(os.path.join(path, META_FILE)) as f:
+        return json.load(f)
+
+
+def snapshot_file(path, name, snapshot):
+    return os.path.join(path, '{}.{}.npy'.format(name, snapshot))
+
+
+class QTable:
+    def __init__(self, n_actions, key_size, max_states=None, capacity=1024):
+        # action values of visited states only: row r of growing arrays holds the key of a state, its hash and its
+        # action values, and slots is an open-addressed hash table of row + 1 (0 when empty), probed linearly
+        self.n_actions = n_actions
+        self.key_size = key_size
+        self.max_states = max_states
+        self.n_states = 0
+        self.values = np.zeros((capacity, n_actions))
+        self.keys = np.zeros((capacity, key_size), dtype=np.uint8)
+        self.hashes = np.zeros(capacity, dtype=np.int32)
+        self.index(capacity)
+
+        # with max_states, the rows from least to most recently used; the first one is evicted to make room
+        self.recent = OrderedDict() if max_states else None
+
+        # returned for states never updated, so reads don't grow the table
+        self.unseen = np.zeros(n_actions)
+        self.unseen.flags.writeable = False
+
+    def __len__(self):
+        return self.n_states
+
+    def __contains__(self, key):
+        return self.search(key) >= 0
+
+    def index(self, capacity):
+        # a slot table for capacity rows that stays at most half full, holding the rows stored so far
+        bits = max(1, (2 * capacity - 1).bit_length())
+        self.slots = np.zeros(1 << bits, dtype=np.int32)
+        self.mask, self.shift = (1 << bits) - 1, 64 - bits
+
+        rows = np.arange(self.n_states)
+        slots = self.homes(self.hashes[:self.n_states])
+        while len(rows):
+            # every empty slot takes the first row probing it, the others probe on
+            free = np.flatnonzero(self.slots[slots] == 0)
+            taken, first = np.unique(slots[free], return_index=True)
+            self.slots[taken] = rows[free[first]] + 1
+            waiting = np.ones(len(rows), dtype=bool)
+            waiting[free[first]] = False
+            rows, slots = rows[waiting], (slots[waiting] + 1) & self.mask
+
+    def home(self, key_hash):
+        return ((key_hash * FIBONACCI) & MASK_64) >> self.shift
+
+    def homes(self, hashes):
+        return ((hashes.astype(np.uint64) * np.uint64(FIBONACCI)) >> np.uint64(self.shift)).astype(np.intp)
+
+    def probe(self, key, key_hash):
+        # the slot holding key and its row, or else the empty slot its probe ends on and -1
+        slot = self.home(key_hash)
+        row = self.slots.item(slot) - 1
+        while row >= 0 and self.keys[row].tobytes() != key:
+            slot = (slot + 1) & self.mask
+            row = self.slots.item(slot) - 1
+        return slot, row
+
+    def search(self, key):
+        # row of key, -1 when it was never updated
+        return self.probe(key, key_hash(key))[1]
+
+    def search_all(self, keys):
+        # rows of a (batch, key size) array of keys, -1 for unseen ones; the keys walk their probes in step,
+        # and the few with long probes finish one at a time
+        rows = np.full(len(keys), -1)
+        if not self.n_states:
+            return rows
+        pending = np.arange(len(keys))
+        slots = self.homes(key_hashes(keys))
+        while len(pending) > PROBE_BATCH:
+            found = self.slots[slots] - 1
+            match = (found >= 0) & (self.keys[found] == keys[pending]).all(axis=1)
+            rows[pending[match]] = found[match]
+            probing = (found >= 0) & ~match
+            pending, slots = pending[probing], (slots[probing] + 1) & self.mask
+        for key in pending.tolist():
+            rows[key] = self.search(keys[key].tobytes())
+        return rows
+
+    def get(self, key):
+        # action values of key, read-only zeros when it was never updated
+        row = self.search(key)
+        if row < 0:
+            return self.unseen
+        if self.recent is not None:
+            self.recent.move_to_end(row)
+        return self.values[row]
+
+    def lookup(self, keys):
+        # (batch, actions) values of keys, zeros for unseen ones; reads do not refresh the eviction order
+        rows = self.search_all(keys)
+        values = np.zeros((len(keys), self.n_actions))
+        seen = rows >= 0
+        values[seen] = self.values[rows[seen]]
+        return values
+
+    def find(self, key):
+        # row of key, adding the state when it is new
+        hashed = key_hash(key)
+        slot, row = self.probe(key, hashed)
+        if row < 0:
+            return self.add(key, hashed, slot)
+        if self.recent is not None:
+            self.recent.move_to_end(row)
+        return row
+
+    def row(self, key):
+        # writable action values of key; found first, as adding it may grow the arrays
+        row = self.find(key)
+        return self.values[row]
+
+    def rows(self, keys):
+        # rows of a batch of keys, adding the new ones; the batch's known states are refreshed before any eviction
+        if self.max_states and len(np.unique(keys, axis=0)) > self.max_states:
+            raise ValueError("a batch cannot touch more states than max_states")
+        rows = self.search_all(keys)
+        if self.recent is not None:
+            for row in rows[rows >= 0].tolist():
+                self.recent.move_to_end(row)
+        for new in np.flatnonzero(rows < 0).tolist():
+            rows[new] = self.find(keys[new].tobytes())
+        return rows
+
+    def update(self, rows, actions, targets, alpha):
+        # one TD step towards targets for a batch of (row, action) pairs; duplicate pairs move by their
+        # mean TD error, so the result does not depend on the batch order
+        flat = rows * self.n_actions + actions
+        pairs, inverse = np.unique(flat, return_inverse=True)
+        values = self.values.reshape(-1)
+        current = values[pairs]
+        errors = np.bincount(inverse, weights=targets - current[inverse]) / np.bincount(inverse)
+        values[pairs] = current + alpha * errors
+
+    def add(self, key, hashed, slot):
+        # store key in the empty slot its probe ended on, unless making room moves the slots
+        if self.max_states and self.n_states >= self.max_states:
+            # reuse the row of the least recently used state
+            row, _ = self.recent.popitem(last=False)
+            self.remove(row)
+            self.values[row] = 0
+            slot, _ = self.probe(key, hashed)
+        else:
+            row = self.n_states
+            if row == len(self.values):
+                self.grow()
+                slot, _ = self.probe(key, hashed)
+            self.n_states += 1
+        self.keys[row] = np.frombuffer(key, dtype=np.uint8)
+        self.hashes[row] = hashed
+        self.slots[slot] = row + 1
+        if self.recent is not None:
+            self.recent[row] = None
+        return row
+
+    def remove(self, row):
+        # empty the slot of row, shifting the rest of its probe run back so every key stays reachable from its home slot
+        slot = self.home(int(self.hashes[row]))
+        while self.slots[slot] != row + 1:
+            slot = (slot + 1) & self.mask
+        later = slot
+        while True:
+            later = (later + 1) & self.mask
+            if not self.slots[later]:
+                break
+            home = self.home(int(self.hashes[self.slots[later] - 1]))
+            if (later - home) & self.mask >= (later - slot) & self.mask:
+                self.slots[slot] = self.slots[later]
+                slot = later
+        self.slots[slot] = 0
+
+    def grow(self):
+        capacity = max(2 * len(self.values), 1024)
+        extra = capacity - len(self.values)
+        self.values = np.concatenate([self.values, np.zeros((extra, self.n_actions))])
+        self.keys = np.concatenate([self.keys, np.zeros((extra, self.key_size), dtype=np.uint8)])
+        self.hashes = np.concatenate([self.hashes, np.zeros(extra, dtype=np.int32)])
+        self.index(capacity)
+
+    def arrays(self):
+        n_states = self.n_states
+        return {'values': self.values[:n_states], 'keys': self.keys[:n_states], 'hashes': self.hashes[:n_states], 'slots': self.slots}
+
+    def checkpoint(self, path, **counters):
+        # save the table as a new snapshot with the training counters, then switch meta.json over to it; until then
+        # the previous snapshot stays whole and in use, so a crash mid-checkpoint only loses this one
+        os.makedirs(path, exist_ok=True)
+        previous = read_meta(path) if os.path.exists(os.path.join(path, META_FILE)) else None
+        snapshot = previous['snapshot'] + 1 if previous else 0
+        for name, array in self.arrays().items():
+            np.save(snapshot_file(path, name, snapshot), array)
+        meta = {'snapshot': snapshot, 'n_states': self.n_states, 'n_actions': self.n_actions, 'max_states': self.max_states, 'key_size': self.key_size, **counters}
+        with open(os.path.join(path, META_FILE + '.tmp'), 'w') as f:
+            json.dump(meta, f)
+        os.replace(os.path.join(path, META_FILE + '.tmp'), os.path.join(path, META_FILE))
+
+        # drop the older snapshots, including any left by an earlier crash
+        current = {os.path.basename(snapshot_file(path, name, snapshot)) for name in ARRAYS}
+        for file in os.listdir(path):
+            if file.split('.')[0] in ARRAYS and file.endswith('.npy') and file not in current:
+                os.remove(os.path.join(path, file))
+
+    @staticmethod
+    def open(path, read_only=False):
+        # the checkpointed table and its meta data; the arrays are mapped and paged in lazily, read-only or copy-on-write
+        # for training, which leaves the snapshot as it was saved
+        meta = read_meta(path)
+        mode = 'r' if read_only else 'c'
+        table = QTable(meta['n_actions'], meta['key_size'], max_states=None if read_only else meta['max_states'], capacity=0)
+        table.n_states = meta['n_states']
+        table.values, table.keys, table.hashes, table.slots = (np.load(snapshot_file(path, name, meta['snapshot']), mmap_mode=mode) for name in ARRAYS)
+        bits = len(table.slots).bit_length() - 1
+        table.mask, table.shift = (1 << bits) - 1, 64 - bits
+
+        # the eviction order is not saved; a capped table restarts it from the row order
+        if table.max_states:
+            table.recent = OrderedDict.fromkeys(range(table.n_states))
+        return table, meta
+
+    def nbytes(self):
+        # the stored states' keys, hashes and values, and the slot table
+        n_states = self.n_states
+        return self.values[:n_states].nbytes + self.keys[:n_states].nbytes + self.hashes[:n_states].nbytes + self.slots.nbytes
+
@@ -0,0 +1,281 @@
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'Evolutionary'))
+
+import numpy
+import game
+import genetics
+from checkpoint import load_blueprint
+from evaluation import SharedPoolEvaluator, VectorEvaluator
+from inference import PopulationBrain, compress
+from steady_state import SteadyState
+
+SEED = 1234
+BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+BLUEPRINT = os.path.join(ROOT, 'Evolutionary', 'snake_data', '80289')
+
+
+def seed_all():
+    random.seed(SEED)
+    numpy.random.seed(SEED)
+    return numpy.random.default_rng(SEED)
+
+
+def measure(fn, number: int, repeat: int = 3):
+    # best-of-repeat rate of fn in calls per second
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, time.perf_counter() - start)
+    return number / best
+
+
+def coiled_snake(length: int):
+    # a snake of the given length winding through the board row by row from the top-left corner
+    snake = game.Snake(start_coords=(0, 0), color=(1, 1, 1))
+    x, direction = 0, 'east'
+    while snake.size() < length:
+        if (direction == 'east' and x == game.GRID_COLS - 1) or (direction == 'west' and x == 0):
+            snake.move('south')
+            direction = 'west' if direction == 'east' else 'east'
+        else:
+            snake.move(direction)
+            x += game.VELOCITIES[direction][0]
+        snake.grow()
+    return snake
+
+
+def bench_nn_process():
+    seed_all()
+    brain = game.Brain(game.N_INPUT, game.N_HIDDEN, game.N_OUTPUT)
+    v_input = list(numpy.random.random(game.N_INPUT))
+    return measure(lambda: brain.nn_process(v_input), number=2000), 'calls/s'
+
+
+def bench_decide():
+    seed_all()
+    snake = coiled_snake(16)
+    fruit = game.Fruit(snake)
+    return measure(lambda: snake.brain.decide(snake, fruit), number=2000), 'calls/s'
+
+
+def bench_population_decide(precision: str):
+    # one batched decision for 2000 random brains with weights at precision
+    def bench():
+        rng = seed_all()
+        genomes, scales = compress(genetics.Population.random(2000, rng).genomes, game.GENOME_SHAPES, precision)
+        brain = PopulationBrain.from_genomes(genomes, game.GENOME_SHAPES, scales)
+        v_inputs = rng.random((2000, game.N_INPUT))
+        return measure(lambda: brain.decide(v_inputs), number=20) * 2000, 'decisions/s'
+    return bench
+
+
+def bench_on_body(length: int):
+    def bench():
+        snake = coiled_snake(length)
+        cells = list(range(game.N_CELLS))
+        return measure(lambda: [snake.on_body(cell=cell) for cell in cells], number=20) * len(cells), 'calls/s'
+    return bench
+
+
+def bench_fruit(length: int):
+    def bench():
+        seed_all()
+        snake = coiled_snake(length)
+        return measure(lambda: game.Fruit(snake), number=2000), 'calls/s'
+    return bench
+
+
+def bench_crossover():
+    seed_all()
+    v_a, v_b = numpy.random.uniform(-1, 1, (2, game.N_HIDDEN, game.N_HIDDEN + 1))
+    return measure(lambda: game.Brain.crossover(v_a, v_b), number=500), 'calls/s'
+
+
+def bench_mutate():
+    seed_all()
+    vector = numpy.random.uniform(-1, 1, (game.N_HIDDEN, game.N_HIDDEN + 1))
+    return measure(lambda: game.Brain.mutate(vector, mutation_rate=0.01), number=500), 'calls/s'
+
+
+def bench_play_game():
+    # steps per second of the trained blueprint, one game at a time
+    seed_all()
+    brain = load_blueprint(BLUEPRINT)
+    steps, start = 0, time.perf_counter()
+    while time.perf_counter() - start < 2.0:
+        snake = game.play_game(game.Snake(color=(1, 1, 1), brain=brain))
+        steps += snake.time_lived + 1
+    return steps / (time.perf_counter() - start), 'steps/s'
+
+
+def bench_generation(size: int):
+    # evaluation plus breeding of one generation of random snakes, in this process
+    def bench():
+        rng = seed_all()
+        population = genetics.Population.random(size, rng)
+        evaluator = VectorEvaluator()
+
+        def generation():
+            fitness = [result[0] for result in evaluator.evaluate(population.genomes)]
+            genetics.next_generation(population, fitness, breeding_threshold=0.25, mutation_rate=0.01, rng=rng)
+        return measure(generation, number=1) * size, 'snakes/s'
+    return bench
+
+
+def bench_generational_pool():
+    # three generations of 500 snakes, one play_game per snake on the shared pool, waiting for every game each generation
+    rng = seed_all()
+    population = genetics.Population.random(500, rng)
+    with SharedPoolEvaluator(population_size=500, genome_shapes=population.genome_shapes) as evaluator:
+        start = time.perf_counter()
+        for _ in range(3):
+            fitness = [result[0] for result in evaluator.evaluate(population.genomes)]
+            population = genetics.next_generation(population, fitness, breeding_threshold=0.25, mutation_rate=0.01, rng=rng)
+        return 3 * 500 / (time.perf_counter() - start), 'snakes/s'
+
+
+def bench_steady_state():
+    # 1500 games bred in batches from tournament winners with no generation barrier, in lockstep shards on the shared pool
+    seed_all()
+    steady_state = SteadyState(500, mutation_rate=0.01, tournament_size=5, seed=SEED)
+    start = time.perf_counter()
+    steady_state.run(3 * 500)
+    seconds = time.perf_counter() - start
+    steady_state.close()
+    return 3 * 500 / seconds, 'snakes/s'
+
+
+def import_qlearning(name):
+    # Q-Learning's modules, found ahead of Evolutionary's main.py
+    sys.path.insert(0, os.path.join(ROOT, 'Q-Learning'))
+    try:
+        return importlib.import_module(name)
+    finally:
+        sys.path.pop(0)
+
+
+def bench_qlearning():
+    # 1000 episodes of the game loop, each time from an empty Q-table
+    qlearning = import_qlearning('main')
+    q_table = import_qlearning('q_table')
+
+    def train():
+        seed_all()
+        qlearning.q_table = q_table.QTable(qlearning.action_space, q_table.key_size(qlearning.n_cells))
+        for _ in range(1000):
+            qlearning.Game().play()
+    return measure(train, number=1) * 1000, 'episodes/s'
+
+
+def bench_qlearning_batch():
+    # the same 1000 episodes from the batched trainer
+    qlearning = import_qlearning('main')
+    batch_trainer = import_qlearning('batch_trainer')
+    q_table = import_qlearning('q_table')
+
+    def train():
+        table = q_table.QTable(batch_trainer.action_space, q_table.key_size(qlearning.n_cells))
+        batch_trainer.BatchTrainer(table, n_envs=256, rng=seed_all()).train(1000)
+    return measure(train, number=1) * 1000, 'episodes/s'
+
+
+BENCHMARKS = {
+    'micro.nn_process': bench_nn_process,
+    'micro.decide': bench_decide,
+    'micro.population_decide[float64]': bench_population_decide('float64'),
+    'micro.population_decide[float32]': bench_population_decide('float32'),
+    'micro.population_decide[int8]': bench_population_decide('int8'),
+    'micro.on_body[4]': bench_on_body(4),
+    'micro.on_body[64]': bench_on_body(64),
+    'micro.on_body[256]': bench_on_body(256),
+    'micro.fruit[4]': bench_fruit(4),
+    'micro.fruit[256]': bench_fruit(256),
+    'micro.fruit[392]': bench_fruit(392),
+    'micro.crossover': bench_crossover,
+    'micro.mutate': bench_mutate,
+    'macro.play_game': bench_play_game,
+    'macro.generation[250]': bench_generation(250),
+    'macro.generation[1000]': bench_generation(1000),
+    'macro.generation[2000]': bench_generation(2000),
+    'macro.generational_pool[500]': bench_generational_pool,
+    'macro.steady_state[500]': bench_steady_state,
+    'macro.qlearning.play': bench_qlearning,
+    'macro.qlearning.batch[256]': bench_qlearning_batch,
+}
+
+
+def run(names):
+    cases = {}
+    for name in names:
+        try:
+            value, unit = BENCHMARKS[name]()
+            cases[name] = {'value': round(value, 2), 'unit': unit}
+            print("{:<26} {:>14,.1f} {}".format(name, value, unit))
+        except Exception as e:
+            cases[name] = {'error': '{}: {}'.format(type(e).__name__, e)}
+            print("{:<26} ERROR {}".format(name, cases[name]['error']))
+    return {
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'machine': platform.machine(),
+        'cases': cases,
+    }
+
+
+def compare(results, baseline, tolerance: float):
+    # a case regresses when it is more than tolerance slower than its baseline rate
+    failures = []
+    for name, case in results['cases'].items():
+        base = baseline['cases'].get(name)
+        if 'error' in case:
+            failures.append("{} failed: {}".format(name, case['error']))
+        elif base and 'value' in base and case['value'] < base['value'] * (1 - tolerance):
+            failures.append("{} regressed: {:,.1f} {} vs baseline {:,.1f}".format(name, case['value'], case['unit'], base['value']))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the snake-AI game, NN, genetics and training loops.")
+    parser.add_argument('names', nargs='*', help="benchmarks to run (default: all)")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    parser.add_argument('--baseline', default=BASELINE, help="baseline JSON to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.3, help="allowed slowdown against the baseline (default: 0.3)")
+    parser.add_argument('--update-baseline', action='store_true', help="store these results as the new baseline")
+    args = parser.parse_args()
+
+    results = run(args.names or list(BENCHMARKS))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print("Baseline saved to '{}'.".format(args.baseline))
+        return
+
+    if not os.path.exists(args.baseline):
+        print("No baseline at '{}'; run with --update-baseline to create one.".format(args.baseline))
+        return
+    with open(args.baseline) as f:
+        failures = compare(results, json.load(f), args.tolerance)
+    for failure in failures:
+        print("FAIL: {}".format(failure))
+    if failures:
+        sys.exit(1)
+    print("All benchmarks within {:.0%} of the baseline.".format(args.tolerance))
+
+
+if __name__ == '__main__':
+    main()
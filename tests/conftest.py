@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the scripts import their neighbours by module name, as when run from their own directory
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'Evolutionary'))
+sys.path.append(os.path.join(ROOT, 'Q-Learning'))
@@ -0,0 +1,52 @@
+import numpy
+from checkpoint import Checkpoint, load_blueprint, load_checkpoint, save_checkpoint, save_genetics
+from game import Brain
+from genetics import Population
+
+
+def test_checkpoint_round_trip(tmp_path):
+    rng = numpy.random.default_rng(0)
+    population = Population.random(size=50, rng=rng)
+    fitness = rng.integers(0, 1000, size=50)
+    gen_data = {generation: {'gen_fitness': float(generation), 'alpha_fitness': 10 * generation} for generation in range(1, 4)}
+    sigma = (2, population.brain(7).serialize())
+    save_checkpoint(tmp_path, Checkpoint(3, population, fitness, rng.bit_generator.state, gen_data, sigma))
+
+    checkpoint = load_checkpoint(tmp_path)
+    assert checkpoint.generation == 3
+    numpy.testing.assert_array_equal(checkpoint.population.genomes, population.genomes)
+    numpy.testing.assert_array_equal(checkpoint.population.colors, population.colors)
+    assert checkpoint.population.genome_shapes == population.genome_shapes
+    numpy.testing.assert_array_equal(checkpoint.fitness, fitness)
+    assert checkpoint.gen_data == gen_data
+    assert checkpoint.sigma[0] == 2
+    for w_layer, v_weights in sigma[1].items():
+        numpy.testing.assert_array_equal(checkpoint.sigma[1][w_layer], v_weights)
+
+    # the restored generator continues the saved one's stream
+    assert checkpoint.rng().random(5).tolist() == rng.random(5).tolist()
+
+
+def test_saving_replaces_the_checkpoint(tmp_path):
+    rng = numpy.random.default_rng(0)
+    for generation in (1, 2):
+        population = Population.random(size=10, rng=rng)
+        save_checkpoint(tmp_path, Checkpoint(generation, population, numpy.zeros(10), rng.bit_generator.state, {}, (generation, population.brain(0).serialize())))
+    assert load_checkpoint(tmp_path).generation == 2
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['checkpoint.npz']
+
+
+def test_blueprint_round_trip(tmp_path):
+    brain = Brain(n_input=24, n_hidden=16, n_output=4)
+    save_genetics(tmp_path, brain.serialize())
+    loaded = load_blueprint(tmp_path)
+    for w_layer, v_weights in brain.serialize().items():
+        numpy.testing.assert_array_equal(getattr(loaded, w_layer), v_weights)
+
+    # runs saved before the .npy files still load from their text weights
+    for w_layer, v_weights in brain.serialize().items():
+        (tmp_path / '{}.npy'.format(w_layer)).unlink()
+        numpy.savetxt(tmp_path / '{}.txt'.format(w_layer), v_weights)
+    loaded = load_blueprint(tmp_path)
+    for w_layer, v_weights in brain.serialize().items():
+        numpy.testing.assert_array_equal(getattr(loaded, w_layer), v_weights)
@@ -0,0 +1,181 @@
+import importlib
+import os
+import sys
+from collections import OrderedDict
+import numpy as np
+import pytest
+from q_table import QTable, encode_state, encode_states, key_hash, key_hashes, key_size
+
+N_CELLS = 100
+N_ACTIONS = 4
+
+
+def import_qlearning(name):
+    # Q-Learning's modules, found ahead of Evolutionary's main.py
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Q-Learning'))
+    try:
+        return importlib.import_module(name)
+    finally:
+        sys.path.pop(0)
+
+
+def random_keys(rng, n):
+    # keys of random states, each with a few body cells
+    return [
+        encode_state(int(rng.integers(0, N_CELLS + 1)), int(rng.integers(0, N_CELLS)), rng.integers(0, N_CELLS, size=rng.integers(0, 6)).tolist(), N_CELLS)
+        for _ in range(n)
+    ]
+
+
+def test_key_hashes_match_key_hash():
+    keys = random_keys(np.random.default_rng(0), 500)
+    batch = np.frombuffer(b''.join(keys), dtype=np.uint8).reshape(len(keys), -1)
+    assert key_hashes(batch).tolist() == [key_hash(key) for key in keys]
+
+
+@pytest.mark.parametrize('max_states, capacity', [(None, 8), (None, 1024), (50, 64), (50, 1024)])
+def test_table_matches_a_dict(max_states, capacity):
+    # random reads and writes against a dict of the same states, evicting the least recently used one when capped;
+    # small capacities crowd the slots, so keys share probe runs and evictions shift them
+    rng = np.random.default_rng(0)
+    keys = random_keys(rng, 3000 if max_states is None else 200)
+    table = QTable(N_ACTIONS, key_size(N_CELLS), max_states=max_states, capacity=capacity)
+    expected = OrderedDict()
+    for _ in range(20000):
+        key = keys[rng.integers(0, len(keys))]
+        if rng.random() < 0.5:
+            values = rng.random(N_ACTIONS)
+            table.row(key)[:] = values
+            if key not in expected and max_states and len(expected) == max_states:
+                expected.popitem(last=False)
+            expected[key] = values
+        else:
+            assert table.get(key).tolist() == (expected[key].tolist() if key in expected else [0.0] * N_ACTIONS)
+        if key in expected:
+            expected.move_to_end(key)
+
+    assert len(table) == len(expected)
+    for key in keys:
+        row = table.search(key)
+        assert (row >= 0) == (key in expected)
+        if row >= 0:
+            assert table.values[row].tolist() == expected[key].tolist()
+
+
+def test_search_all_matches_search():
+    rng = np.random.default_rng(0)
+    keys = random_keys(rng, 3000)
+    table = QTable(N_ACTIONS, key_size(N_CELLS))
+    for key in keys[:2000]:
+        table.row(key)[:] = rng.random(N_ACTIONS)
+    batch = np.frombuffer(b''.join(keys), dtype=np.uint8).reshape(len(keys), -1)
+    rows = table.search_all(batch)
+    assert rows.tolist() == [table.search(key) for key in keys]
+    assert table.lookup(batch).tolist() == [table.get(key).tolist() for key in keys]
+
+
+def test_checkpoint_round_trip(tmp_path):
+    rng = np.random.default_rng(0)
+    keys = random_keys(rng, 2000)
+    table = QTable(N_ACTIONS, key_size(N_CELLS), max_states=5000)
+    for key in keys:
+        table.row(key)[:] = rng.random(N_ACTIONS)
+    table.checkpoint(tmp_path, episodes=10)
+    table.row(keys[0])[:] = 1.0
+    table.checkpoint(tmp_path, episodes=20)
+
+    loaded, meta = QTable.open(tmp_path, read_only=True)
+    assert meta['episodes'] == 20 and len(loaded) == len(table) and loaded.max_states is None
+    for key in keys:
+        assert loaded.get(key).tolist() == table.get(key).tolist()
+    # only the snapshot in use is kept
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['hashes.1.npy', 'keys.1.npy', 'meta.json', 'slots.1.npy', 'values.1.npy']
+
+    # training a warm-started table writes to its own copy, not to the snapshot
+    warm, meta = QTable.open(tmp_path)
+    assert warm.max_states == 5000
+    warm.row(keys[0])[:] = 2.0
+    for key in random_keys(rng, 3000):
+        warm.row(key)[:] = 3.0
+    assert QTable.open(tmp_path, read_only=True)[0].get(keys[0]).tolist() == [1.0] * N_ACTIONS
+    assert warm.get(keys[0]).tolist() == [2.0] * N_ACTIONS
+
+
+def test_encode_states_matches_encode_state():
+    rng = np.random.default_rng(0)
+    for n_cells in (1, 8, 100, 301):
+        heads = rng.integers(0, n_cells + 1, size=200)
+        fruits = rng.integers(0, n_cells, size=200)
+        body_masks = rng.random((200, n_cells)) < rng.random((200, 1))
+        keys = encode_states(heads, fruits, body_masks)
+        assert keys.shape == (200, key_size(n_cells))
+        for key, head, fruit, body_mask in zip(keys, heads.tolist(), fruits.tolist(), body_masks):
+            assert key.tobytes() == encode_state(head, fruit, np.flatnonzero(body_mask).tolist(), n_cells)
+
+
+def test_rows_match_find():
+    # a batch adds its new states in order, once each, as finding them one by one would
+    rng = np.random.default_rng(0)
+    keys = random_keys(rng, 300)
+    table, expected = QTable(N_ACTIONS, key_size(N_CELLS), capacity=8), QTable(N_ACTIONS, key_size(N_CELLS), capacity=8)
+    for _ in range(10):
+        batch = [keys[i] for i in rng.integers(0, len(keys), size=256)]
+        rows = table.rows(np.frombuffer(b''.join(batch), dtype=np.uint8).reshape(len(batch), -1))
+        assert rows.tolist() == [expected.find(key) for key in batch]
+
+
+def test_rows_reject_batches_over_max_states():
+    keys = random_keys(np.random.default_rng(0), 20)
+    table = QTable(N_ACTIONS, key_size(N_CELLS), max_states=len(set(keys)) - 1)
+    with pytest.raises(ValueError):
+        table.rows(np.frombuffer(b''.join(keys), dtype=np.uint8).reshape(len(keys), -1))
+
+
+def test_update_moves_duplicates_by_their_mean_error():
+    table = QTable(N_ACTIONS, key_size(N_CELLS))
+    rows = np.array([table.find(key) for key in random_keys(np.random.default_rng(0), 2)])
+    table.values[rows[0], 1] = 1.0
+    table.update(rows[[0, 0, 0, 1]], np.array([1, 1, 2, 1]), np.array([2.0, 4.0, 1.0, -1.0]), 0.5)
+    assert table.values[rows[0]].tolist() == [0.0, 1.0 + 0.5 * 2.0, 0.5, 0.0]
+    assert table.values[rows[1]].tolist() == [0.0, -0.5, 0.0, 0.0]
+
+
+def test_batch_game_matches_game():
+    # every BatchGame game plays like a main.Game given the same actions and fruit cells, and encodes the same states
+    qlearning = import_qlearning('main')
+    batch_trainer = import_qlearning('batch_trainer')
+    rng = np.random.default_rng(0)
+    batch = batch_trainer.BatchGame(50, rng=np.random.default_rng(1))
+    games = [qlearning.Game() for _ in range(batch.n_envs)]
+
+    def sync(env):
+        # the scalar game takes the fruit the batched one placed
+        fruit_y, fruit_x = divmod(int(batch.fruit[env]), batch.cols)
+        games[env].fruit.x, games[env].fruit.y = fruit_x * qlearning.block_size, fruit_y * qlearning.block_size
+
+    for env in range(batch.n_envs):
+        sync(env)
+    scores = 0
+    for _ in range(2000):
+        assert [key.tobytes() for key in batch.states()] == [game.get_current_state() for game in games]
+
+        # head for the fruit, with a rare random move
+        fruit_y, fruit_x = np.divmod(batch.fruit, batch.cols)
+        dx, dy = fruit_x - batch.x, fruit_y - batch.y
+        actions = np.where(dx != 0, np.where(dx > 0, 0, 1), np.where(dy < 0, 2, 3))
+        actions = np.where(rng.random(batch.n_envs) < 0.01, rng.integers(0, 4, size=batch.n_envs), actions)
+
+        rewards, dead = batch.step(actions)
+        for env, game in enumerate(games):
+            assert rewards[env] == game.execute_action(int(actions[env]))
+            assert dead[env] == (not game.snake.is_alive)
+            assert batch.score[env] == game.snake.score
+        scores += int(batch.score[dead].sum())
+
+        ended = np.flatnonzero(dead)
+        batch.reset(ended)
+        for env in ended.tolist():
+            games[env] = qlearning.Game()
+        for env in range(batch.n_envs):
+            sync(env)
+    assert scores > 1000
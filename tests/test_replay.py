@@ -0,0 +1,53 @@
+import numpy
+import pytest
+from replay import SEED_LIMIT, Replay, append_replay, load_replays, truncate_replays
+
+
+def random_replay(rng, n_decisions, grid_size=(20, 20), seed=None, generation=0):
+    cols, rows = grid_size
+    decisions = rng.integers(0, 4, size=n_decisions)
+    fruit = rng.integers(0, cols * rows, size=rng.integers(1, 50))
+    return Replay(decisions, fruit, int(rng.integers(0, 1 << 32)), seed, generation, tuple(rng.integers(0, 256, size=3).tolist()), grid_size)
+
+
+def assert_same(replay, other):
+    assert other.decisions.tolist() == replay.decisions.tolist()
+    assert other.fruit.tolist() == replay.fruit.tolist()
+    assert (other.fitness, other.seed, other.generation, other.color, other.grid_size) == (replay.fitness, replay.seed, replay.generation, replay.color, replay.grid_size)
+
+
+@pytest.mark.parametrize('seed', [None, 0, 7, SEED_LIMIT - 1])
+@pytest.mark.parametrize('grid_size', [(20, 20), (256, 256), (300, 300)])
+def test_pack_round_trip(seed, grid_size):
+    rng = numpy.random.default_rng(0)
+    for n_decisions in range(9):
+        replay = random_replay(rng, n_decisions, grid_size, seed)
+        buffer = b'padding' + replay.pack()
+        unpacked, offset = Replay.unpack(buffer, len(b'padding'))
+        assert offset == len(buffer)
+        assert_same(replay, unpacked)
+
+
+def test_large_boards_keep_their_fruit_cells():
+    replay = Replay([0, 1], [65535, 65536, 299 * 300 + 299], 400, grid_size=(300, 300))
+    assert Replay.unpack(replay.pack())[0].fruit.tolist() == [65535, 65536, 299 * 300 + 299]
+
+
+@pytest.mark.parametrize('seed', [-1, SEED_LIMIT])
+def test_out_of_range_seeds_are_rejected(seed):
+    with pytest.raises(ValueError):
+        Replay([0], [1], 200, seed=seed).pack()
+
+
+def test_log_round_trip(tmp_path):
+    rng = numpy.random.default_rng(0)
+    replays = [random_replay(rng, int(rng.integers(0, 500)), seed=generation, generation=generation) for generation in range(1, 11)]
+    for replay in replays:
+        append_replay(tmp_path, replay)
+    for replay, loaded in zip(replays, load_replays(tmp_path), strict=True):
+        assert_same(replay, loaded)
+
+    # resuming from generation 6 drops the later replays
+    truncate_replays(tmp_path, 6)
+    for replay, loaded in zip(replays[:6], load_replays(tmp_path), strict=True):
+        assert_same(replay, loaded)
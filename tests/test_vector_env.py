@@ -0,0 +1,80 @@
+import numpy
+import pytest
+from game import GENOME_SHAPES, GRID_COLS, SENSORS, Snake, play_game
+from genetics import Population
+from inference import PopulationBrain
+from vector_env import VectorGame
+
+N_GAMES = 200
+
+
+def greedy_decisions(game, games, rng):
+    # head for the fruit along x, then y, with a rare random move; the snakes eat often and grow long
+    fruit_y, fruit_x = numpy.divmod(game.fruit[games], GRID_COLS)
+    dx, dy = fruit_x - game.x[games], fruit_y - game.y[games]
+    decisions = numpy.where(dx != 0, numpy.where(dx < 0, 0, 1), numpy.where(dy < 0, 2, 3))
+    return numpy.where(rng.random(len(games)) < 0.01, rng.integers(0, 4, size=len(games)), decisions)
+
+
+def play_greedy(seed=None, episodes=1, on_step=None):
+    rng = numpy.random.default_rng(0)
+    game = VectorGame(N_GAMES // episodes, rng=numpy.random.default_rng(1), seed=seed, episodes=episodes, record=True)
+    while game.alive.any():
+        games = numpy.flatnonzero(game.alive)
+        if on_step is not None:
+            on_step(game, games)
+        game.step(games, greedy_decisions(game, games, rng))
+    return game
+
+
+def play_brains(seed=None):
+    population = Population.random(size=N_GAMES, rng=numpy.random.default_rng(0))
+    game = VectorGame(N_GAMES, rng=numpy.random.default_rng(1), seed=seed, record=True)
+    game.run(PopulationBrain.from_genomes(population.genomes, GENOME_SHAPES))
+    return population, game
+
+
+def test_greedy_games_grow():
+    # the games below only cover eating and growing if the snakes get to do it
+    assert play_greedy().length.max() > 20
+
+
+def test_sense_batch_matches_sense():
+    def check(game, games):
+        v_inputs = game.sense(games)
+        for row, g in enumerate(games.tolist()):
+            expected = SENSORS.sense(head_cell=int(game.cell[g]), occupancy=game.occupancy[g].tolist(), fruit_cell=int(game.fruit[g]))
+            assert v_inputs[row].tolist() == expected
+
+    play_greedy(on_step=check)
+
+
+@pytest.mark.parametrize('seed', [None, 7])
+def test_replays_reproduce_games(seed):
+    # play_game on a game's recorded decisions and fruit ends it with the same fitness, size and time lived
+    game = play_greedy(seed=seed, episodes=2)
+    fitness = game.fitness()
+    for g in range(game.n_games):
+        replay = game.replay(g)
+        snake = play_game(Snake(color=replay.color), replay=replay)
+        assert (snake.fitness(), snake.size(), snake.time_lived) == (fitness[g], game.length[g], game.time_lived[g])
+        assert replay.fitness == fitness[g] and replay.seed == seed
+
+
+@pytest.mark.parametrize('seed', [None, 7])
+def test_lockstep_brains_match_play_game(seed):
+    # each brain played by play_game with the fruit cells of its lockstep game makes the same decisions
+    population, game = play_brains(seed=seed)
+    for g, (fitness, size, time_lived) in enumerate(game.results()):
+        fruit = iter(game.replay(g).fruit.tolist())
+        snake = Snake(color=(255, 255, 255), brain=population.brain(g))
+        snake.free.sample = lambda: next(fruit)
+        play_game(snake)
+        assert (snake.fitness(), snake.size(), snake.time_lived) == (fitness, size, time_lived)
+        assert next(fruit, None) is None
+
+
+def test_seeded_games_depend_only_on_the_brain():
+    _, game = play_brains(seed=7)
+    _, again = play_brains(seed=7)
+    assert game.results() == again.results()